@@ -1,9 +1,23 @@
 # actions.py
 class ActionPlanner:
-    def plan(self, rca_results):
+    def plan(self, rca_results, capacity=None):
+        """
+        capacity: CapacityModel.recommend 的结果；模型目标高于当前副本数时直接给出目标，
+        否则（无模型 / 模型认为无需扩容）保留 +1 的保守建议
+        """
         actions = []
         for r in rca_results:
             if "Scale" in r["suggestion"]:
+                if capacity and capacity["target"] > capacity["current"]:
+                    actions.append({
+                        "action": "SCALE",
+                        "target": f"deployment/{capacity['service']}",
+                        "replicas": capacity["target"],
+                        "from": capacity["current"],
+                        "auto": False,
+                        "capacity": capacity
+                    })
+                    break
                 actions.append({
                     "action": "SCALE",
                     "target": "deployment/newbee-mall",
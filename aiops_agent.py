@@ -1,42 +1,44 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import gzip
+import atexit
 import json
 import os
+import sys
 import time
-import subprocess
 import requests
-import socket
 from datetime import datetime, timezone
 from typing import Dict, Any, List, Tuple
 
 from detectors import (
     ErrorSpikeDetector,
     LatencyDetector,
-    SaturationDetector
+    SaturationDetector,
+    ChangePointDetector
 )
 from correlator import Correlator
 from rca import RCAEngine
 from actions import ActionPlanner
+from records import payload_to_records
+from serializer import read_payload
+from health import HealthProber, load_probe_config
+from decision import Decision
+from policy import PolicyEngine
+from state_builder import build_state
+from sinks import DecisionSink
+from profiling import CycleProfiler
+from capacity import CapacityModel
 
 # =========================
 # 基础配置
 # =========================
 INPUT_DIR = "/root/aiops-data-prepare/out_json"
 POLL_INTERVAL = 10
+SINK_STATS_INTERVAL = 300
 CONFIG_FILE = "./agent_config.json"
 
 FLASHRAG_URL = "http://192.168.137.103:8000/rag_query"
 
-POD_CHECK_LIST = [
-    {"name": "newbee-mall", "namespace": "newbee-mall", "desired_replicas": 3},
-]
-
-# 数据库检测配置
-DB_HOST = os.getenv("MYSQL_HOST", "192.168.137.108")
-DB_PORT = int(os.getenv("MYSQL_PORT", 3306))
-
 # =========================
 # 配置加载
 # =========================
@@ -50,6 +52,21 @@ AGENT_CONFIG = load_agent_config()
 AUTO_SCALE_ENABLED = AGENT_CONFIG.get("auto_scale", {}).get("enabled", False)
 MAX_SCALE = AGENT_CONFIG.get("auto_scale", {}).get("max_scale", 10)
 
+# Pod / DB 探测目标见 agent_config.json 的 health_probes 段
+HEALTH_PROBER = HealthProber(load_probe_config(CONFIG_FILE))
+POLICY = PolicyEngine(AGENT_CONFIG)
+# 跨 payload 累积的容量模型（吞吐 / 延迟曲线 / 负载预测）
+CAPACITY = CapacityModel()
+
+# Decision 输出（见 agent_config.json 的 output 段）
+DECISION_SINK = DecisionSink.from_config(AGENT_CONFIG.get("output", {
+    "writers": [{"type": "jsonl", "path": "./decisions.jsonl"}]
+}))
+atexit.register(DECISION_SINK.close)
+
+# 每个 payload 的处理剖析（见 agent_config.json 的 profiling 段）
+PROFILER = CycleProfiler.from_config("agent", AGENT_CONFIG.get("profiling", {}))
+
 # =========================
 # 工具函数
 # =========================
@@ -57,27 +74,26 @@ def utc_now() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 def load_payload(path: str) -> Dict[str, Any]:
-    with gzip.open(path, "rt", encoding="utf-8") as f:
-        return json.load(f)
+    return payload_to_records(read_payload(path))
 
 # =========================
 # 数据库检测
 # =========================
 def check_db_connection() -> List[Dict[str, Any]]:
     """
-    检查 MySQL TCP 3306 是否可达
+    检查配置中各数据库 TCP 是否可达（结果与 exporter 共享缓存）
     """
     errors = []
-    try:
-        s = socket.create_connection((DB_HOST, DB_PORT), timeout=3)
-        s.close()
-    except Exception as e:
+    for r in HEALTH_PROBER.probe(kinds=("db",)):
+        if r["up"]:
+            continue
         errors.append({
             "type": "DB_CONNECTION_ERROR",
             "service": "database",
-            "timestamp": utc_now(),
+            "timestamp": r["checked_at"],
             "exception_type": "DBConnectionError",
-            "exception_message": f"Cannot connect to MySQL at {DB_HOST}:{DB_PORT} - {e}"
+            "exception_message": f"Cannot connect to {r['target']} at {r['host']}:{r['port']} - {r.get('error')}",
+            "evidence": {"connect_latency_ms": r["latency_ms"]}
         })
     return errors
 
@@ -99,11 +115,19 @@ def run_flashrag_rag(payload: Dict[str, Any], pod_anomalies: List[Dict[str, Any]
     for db in db_anomalies:
         lines.append(f"数据库错误: {db.get('exception_message')}")
 
-    # Pod 异常
+    # 探测耗时（exporter 写入的 health 段）
+    for h in payload.get("health", []):
+        state = "可达" if h.get("up") else "不可达"
+        lines.append(f"探测: {h.get('target')} {state} 耗时 {h.get('latency_ms')}ms")
+
+    # Pod 异常（POD_CHECK_FAILED 没有 ready / desired，单独描述）
     for pa in pod_anomalies:
-        lines.append(
-            f"Pod 异常: {pa['service']} 就绪 {pa['ready']}/{pa['desired']}"
-        )
+        if pa["type"] == "POD_CHECK_FAILED":
+            lines.append(f"Pod 检查失败: {pa.get('service')} {pa.get('message', '')}")
+        else:
+            lines.append(
+                f"Pod 异常: {pa.get('service')} 就绪 {pa.get('ready')}/{pa.get('desired')}"
+            )
 
     query_text = "\n".join(lines)
 
@@ -121,36 +145,32 @@ def run_flashrag_rag(payload: Dict[str, Any], pod_anomalies: List[Dict[str, Any]
 # =========================
 # Pod 检测（只检测，不执行）
 # =========================
-def check_pods() -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+def check_pods() -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """返回 (异常, 扩容建议, 探测结果)；探测结果供 pod_status_of 复用，不再重复探测"""
     pod_anomalies = []
     pod_recommendations = []
+    results = HEALTH_PROBER.probe(kinds=("pod",))
+
+    for r in results:
+        name = r["target"]
+        ns = r["namespace"]
+        desired = r["desired"]
 
-    for pod_cfg in POD_CHECK_LIST:
-        name = pod_cfg["name"]
-        ns = pod_cfg["namespace"]
-        desired = pod_cfg["desired_replicas"]
-
-        try:
-            cmd = [
-                "kubectl", "get", "deploy", name, "-n", ns,
-                "-o", "jsonpath={.status.readyReplicas}"
-            ]
-            r = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
-            ready = int(r.stdout.strip() or "0")
-        except Exception as e:
+        if "ready" not in r:
             pod_anomalies.append({
                 "type": "POD_CHECK_FAILED",
                 "service": name,
-                "timestamp": utc_now(),
-                "message": str(e)
+                "timestamp": r["checked_at"],
+                "message": r.get("error", "")
             })
             continue
 
+        ready = r["ready"]
         if ready < desired:
             pod_anomalies.append({
                 "type": "POD_INSUFFICIENT",
                 "service": name,
-                "timestamp": utc_now(),
+                "timestamp": r["checked_at"],
                 "ready": ready,
                 "desired": desired,
                 "severity": "HIGH"
@@ -166,7 +186,118 @@ def check_pods() -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
                 "reason": "Pod 就绪数量不足"
             })
 
-    return pod_anomalies, pod_recommendations
+    return pod_anomalies, pod_recommendations, results
+
+def pod_status_of(service: str, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    for r in results:
+        if r["target"] == service:
+            return {"ready": r.get("ready", 0), "desired": r["desired"]}
+    return {}
+
+# =========================
+# 单个 payload 处理
+# =========================
+def process_payload(fn: str):
+    path = os.path.join(INPUT_DIR, fn)
+    payload = load_payload(path)
+    PROFILER.set_output(path, payload.get("meta", {}).get("seq", fn))
+    PROFILER.lap("load")
+    detections: List[Dict[str, Any]] = []
+
+    # 1. 常规异常
+    detections += ErrorSpikeDetector().detect(payload)
+    detections += LatencyDetector().detect(payload)
+    detections += SaturationDetector().detect(payload)
+    detections += ChangePointDetector().detect(payload)
+    PROFILER.lap("detect")
+
+    # 2. Pod 异常
+    pod_anomalies, pod_recos, pod_results = check_pods()
+    detections += pod_anomalies
+    payload.setdefault("errors", []).extend([
+        {
+            "timestamp": a["timestamp"],
+            "service": a["service"],
+            "exception_type": a["type"],
+            "exception_message": f"Pod {a.get('ready')}/{a.get('desired')}"
+        }
+        for a in pod_anomalies if a["type"] == "POD_INSUFFICIENT"
+    ])
+
+    # 3. DB 异常
+    db_anomalies = check_db_connection()
+    detections += db_anomalies
+    payload.setdefault("errors", []).extend(db_anomalies)
+    PROFILER.lap("probe")
+
+    # 容量模型：每个 payload 都观测，用于计算满足 SLO 的目标副本数
+    service = payload.get("meta", {}).get("service_hint", "unknown")
+    pod_status = pod_status_of(service, pod_results)
+    CAPACITY.observe(payload, {service: pod_status.get("ready")})
+    bounds = POLICY.scale_bounds(service)
+    capacity = CAPACITY.recommend(
+        service, pod_status.get("ready") or 0, bounds["latency_slo_ms"],
+        bounds["min_replicas"], min(bounds["max_scale"], MAX_SCALE)
+    )
+    if capacity:
+        for rec in pod_recos:
+            if rec["target"] == f"deployment/{service}":
+                rec["to"] = min(max(rec["to"], capacity["target"]), MAX_SCALE)
+                rec["capacity"] = capacity
+    PROFILER.lap("capacity")
+
+    if not detections:
+        print(f"[OK] {fn} no anomaly")
+        return
+
+    # 4. 关联分析
+    correlated = Correlator().run(payload, detections)
+    PROFILER.lap("correlate")
+
+    # 5. RCA V1/V2
+    rca = RCAEngine().analyze(payload, correlated)
+
+    # 6. Action Recommendation（不执行）
+    plan = ActionPlanner().plan(rca, capacity)
+    plan.setdefault("actions", []).extend(pod_recos)
+
+    # DB 异常也可以生成 Action 告警
+    for db_err in db_anomalies:
+        plan.setdefault("actions", []).append({
+            "action": "ALERT",
+            "target": "database",
+            "auto_allowed": False,
+            "reason": db_err.get("exception_message")
+        })
+    PROFILER.lap("rca")
+
+    # 7. RCA V3（FlashRAG）
+    rca_v3 = run_flashrag_rag(payload, pod_anomalies, db_anomalies)
+    PROFILER.lap("flashrag")
+
+    # 8. Decision 输出（异步批量写入，不阻塞检测）
+    decision = Decision(
+        service=service,
+        state=build_state(payload, pod_status),
+        anomalies=correlated,
+        rca_v1v2=rca,
+        rca_v3=rca_v3
+    )
+    for action in plan.get("actions", []):
+        decision.add_recommendation(action)
+    decision.set_execution(
+        auto_enabled=POLICY.allow_auto_scale(service, correlated),
+        executed=False,
+        reason="control_plane_mode"
+    )
+    DECISION_SINK.emit(decision)
+    PROFILER.lap("emit")
+
+    print("\n=== AIOps Decision (V1/V2) ===")
+    print(json.dumps(plan, indent=2, ensure_ascii=False))
+
+    print("\n=== FlashRAG V3 RCA ===")
+    print(rca_v3)
 
 # =========================
 # 主循环（Control Plane）
@@ -174,71 +305,25 @@ def check_pods() -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
 def main_loop():
     print("[AIOps-Agent] started (Control Plane mode)")
     seen = set()
+    last_stats = time.time()
 
     while True:
         for fn in sorted(os.listdir(INPUT_DIR)):
-            if not fn.endswith(".json.gz") or fn in seen:
+            if not fn.endswith((".json.gz", ".json.zst")) or fn in seen:
                 continue
             seen.add(fn)
 
-            payload = load_payload(os.path.join(INPUT_DIR, fn))
-            detections: List[Dict[str, Any]] = []
-
-            # 1. 常规异常
-            detections += ErrorSpikeDetector().detect(payload)
-            detections += LatencyDetector().detect(payload)
-            detections += SaturationDetector().detect(payload)
-
-            # 2. Pod 异常
-            pod_anomalies, pod_recos = check_pods()
-            detections += pod_anomalies
-            payload.setdefault("errors", []).extend([
-                {
-                    "timestamp": a["timestamp"],
-                    "service": a["service"],
-                    "exception_type": a["type"],
-                    "exception_message": f"Pod {a.get('ready')}/{a.get('desired')}"
-                }
-                for a in pod_anomalies if a["type"] == "POD_INSUFFICIENT"
-            ])
-
-            # 3. DB 异常
-            db_anomalies = check_db_connection()
-            detections += db_anomalies
-            payload.setdefault("errors", []).extend(db_anomalies)
-
-            if not detections:
-                print(f"[OK] {fn} no anomaly")
-                continue
-
-            # 4. 关联分析
-            correlated = Correlator().run(payload, detections)
-
-            # 5. RCA V1/V2
-            rca = RCAEngine().analyze(payload, correlated)
-
-            # 6. Action Recommendation（不执行）
-            plan = ActionPlanner().plan(rca)
-            plan.setdefault("actions", []).extend(pod_recos)
-
-            # DB 异常也可以生成 Action 告警
-            for db_err in db_anomalies:
-                plan.setdefault("actions", []).append({
-                    "action": "ALERT",
-                    "target": "database",
-                    "auto_allowed": False,
-                    "reason": db_err.get("exception_message")
-                })
-
-            # 7. RCA V3（FlashRAG）
-            rca_v3 = run_flashrag_rag(payload, pod_anomalies, db_anomalies)
-
-            # 8. 输出
-            print("\n=== AIOps Decision (V1/V2) ===")
-            print(json.dumps(plan, indent=2, ensure_ascii=False))
-
-            print("\n=== FlashRAG V3 RCA ===")
-            print(rca_v3)
+            # 单个 payload 处理失败（数据异常 / 探测异常等）不能让 agent 退出
+            try:
+                with PROFILER.cycle():
+                    process_payload(fn)
+            except Exception as e:
+                print(f"[ERROR] {fn} processing failed: {e!r}", file=sys.stderr)
+
+        # Decision 投递指标（emitted / dropped / 各写入器 delivered / failed）
+        if time.time() - last_stats >= SINK_STATS_INTERVAL:
+            print(f"[SINK] {json.dumps(DECISION_SINK.stats(), ensure_ascii=False)}")
+            last_stats = time.time()
 
         time.sleep(POLL_INTERVAL)
 
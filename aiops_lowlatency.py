@@ -1,12 +1,19 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import os, sys, json, gzip, time, uuid, socket
+import os, sys, json, time, uuid
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, List
 import clickhouse_connect
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from records import (LOG_KEYS, TRACE_KEYS, LOG_RAW_KEYS, TRACE_RAW_KEYS, METRIC_KEYS_MAIN, METRIC_KEYS_FALLBACK,
+                     METRIC_SERIES_KEYS, ERROR_KEYS)
+from serializer import columns_to_objs, compile_schema, atomic_payload_write, payload_suffix
+from sampling import sample_logs, sample_spans
+from health import HealthProber, load_probe_config
+from profiling import CycleProfiler
+
 # ================== 基本配置（低延迟档） ==================
 HOST = 'clickhouse.sun.com'
 PORT = 80
@@ -16,6 +23,8 @@ PASSWORD = '27ff0399-0d3a-4bd8-919d-17c2181e6fb9'
 SERVICE_HINT = 'newbee-mall'
 OUTPUT_DIR = './out_json'
 STATE_FILE = './state.json'
+# DB 探测目标（health_probes 段），与 agent 共用配置和状态缓存
+HEALTH_CONFIG_FILE = os.getenv('AIOPS_AGENT_CONFIG', './agent_config.json')
 
 ROLL_INTERVAL_SEC = 30
 WINDOW_SEC = 900  # 15 分钟窗口，保证慢数据也能抓到
@@ -23,10 +32,44 @@ WINDOW_SEC = 900  # 15 分钟窗口，保证慢数据也能抓到
 MAX_RETRIES = 3
 RETRY_BASE_SEC = 1
 
+# 分层采样预算（error 全保留 / 每个 operation 的尾延迟样本 / 其余均匀样本）
+# 总量与旧版 LIMIT 5000 保持一致
+TRACE_SAMPLE_ERROR = 1500
+TRACE_SAMPLE_TAIL_PER_OP = 20
+TRACE_SAMPLE_TAIL = 1000
+TRACE_SAMPLE_UNIFORM = 2500
+LOG_SAMPLE_ERROR = 2000
+LOG_SAMPLE_UNIFORM = 3000
+# 服务端采样的扫描上限（保护 ClickHouse）；服务端采样失败时本地采样前最多拉取的行数
+SERVER_SAMPLE_SCAN_LIMIT = 1000000
+SAMPLE_SCAN_LIMIT = 50000
+
+# 周期剖析：每第 N 个周期 / 超过 SLOW_MS 的周期采样调用栈，每第 M 个周期抓 tracemalloc 快照
+# 全部为 0 时只做阶段计时；产物写在 payload 旁边
+PROFILE_EVERY_N = int(os.getenv('AIOPS_PROFILE_EVERY_N', 0))
+PROFILE_SLOW_MS = float(os.getenv('AIOPS_PROFILE_SLOW_MS', 0))
+PROFILE_INTERVAL_MS = float(os.getenv('AIOPS_PROFILE_INTERVAL_MS', 5))
+PROFILE_TRACEMALLOC_EVERY_N = int(os.getenv('AIOPS_PROFILE_TRACEMALLOC_EVERY_N', 0))
+
+# 指标序列导出：按 step 降采样后的每条序列（供 agent 变点检测）
+METRIC_SERIES_ENABLED = True
+METRIC_SERIES_STEP_SEC = 30
+# 序列使用固定回看窗口（与增量运行窗口无关），稳态下每条序列也有 LOOKBACK / STEP 个点
+METRIC_SERIES_LOOKBACK_SEC = WINDOW_SEC
+METRIC_SERIES_MAX = 10000
+
+# k8s.pod.cpu_limit_utilization（kubeletstats，0~1 gauge）供 agent 容量模型计算利用率，
+# 需要 k8sattributes 处理器补上 k8s.deployment.name（sql_metrics_main 据此归到服务）；
+# node_cpu_seconds_total 等累计计数器不能当作利用率使用
 METRIC_WHITELIST_PATTERNS = [
-    "node_%", "http.%", "signoz_%",
+    "node_%", "http.%", "signoz_%", "k8s.pod.cpu_limit_utilization",
 ]
 
+# payload 编码：gzip | zstd；PAYLOAD_COMPACT=False 时与旧版 indent=2 输出逐字节一致
+PAYLOAD_COMPRESSION = os.getenv('PAYLOAD_COMPRESSION', 'gzip')
+PAYLOAD_COMPRESS_LEVEL = int(os.getenv('PAYLOAD_COMPRESS_LEVEL', 6))
+PAYLOAD_COMPACT = os.getenv('PAYLOAD_COMPACT', '1') != '0'
+
 LOG_DB = 'signoz_logs'
 TRACE_DB = 'signoz_traces'
 METRIC_DB = 'signoz_metrics'
@@ -53,46 +96,20 @@ def save_state(state: Dict[str, Any]):
 def mk_seq(ts_end: datetime) -> str:
     return ts_end.strftime('%Y%m%dT%H%M') + '-' + uuid.uuid4().hex[:6]
 
-def safe_json_value(v):
-    if v is None or isinstance(v, (str, int, float, bool)):
-        return v
-    if isinstance(v, datetime):
-        return v.isoformat()
-    if isinstance(v, (bytes, bytearray)):
-        try: return v.decode('utf-8')
-        except Exception: return v.hex()
-    try:
-        if isinstance(v, memoryview):
-            b = v.tobytes()
-            try: return b.decode('utf-8')
-            except Exception: return b.hex()
-    except Exception: pass
-    if isinstance(v, dict):
-        return {str(k): safe_json_value(vv) for k, vv in v.items()}
-    if isinstance(v, (list, tuple)):
-        return [safe_json_value(vv) for vv in v]
-    return str(v)
-
-def rows_to_objs(keys, rows):
-    return [{k: safe_json_value(v) for k, v in zip(keys, r)} for r in rows]
-
-def atomic_gzip_write(path: str, payload: Dict[str, Any]):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    tmp = path + '.partial'
-    with gzip.open(tmp, 'wt', encoding='utf-8') as g:
-        json.dump(payload, g, ensure_ascii=False, indent=2)
-    os.replace(tmp, path)
+# 让驱动直接返回字符串，省去 bytes / UUID / IP 对象的逐值转换
+CH_QUERY_FORMATS = {'FixedString': 'string', 'UUID': 'string', 'IPv*': 'string'}
 
 def run_ch_query(sql: str) -> List[List[Any]]:
+    """返回列式结果（每列一个 list）"""
     client = clickhouse_connect.get_client(host=HOST, port=PORT, username=USERNAME, password=PASSWORD)
     try:
-        return client.query(sql).result_rows
+        return client.query(sql, query_formats=CH_QUERY_FORMATS).result_columns
     finally:
         try: client.close()
         except Exception: pass
 
 # ================== SQL 模板 ==================
-def sql_logs_by_ns(start_ns: int, end_ns: int):
+def sql_logs_by_ns(start_ns: int, end_ns: int, limit: int = 5000):
     return f"""
     SELECT
         toDateTime64(timestamp / 1e9, 9) AS time,
@@ -120,10 +137,10 @@ def sql_logs_by_ns(start_ns: int, end_ns: int):
          OR lower(body) LIKE '%failed%'
       )
     ORDER BY time DESC
-    LIMIT 5000
+    LIMIT {limit}
     """
 
-def sql_traces_best_effort(start_iso: str, end_iso: str):
+def sql_traces_best_effort(start_iso: str, end_iso: str, limit: int = 5000):
     return f"""
     SELECT
         timestamp AS ts,
@@ -148,8 +165,57 @@ def sql_traces_best_effort(start_iso: str, end_iso: str):
       AND timestamp <  toDateTime64(parseDateTimeBestEffort('{end_iso}'),   9)
       AND (serviceName = '{SERVICE_HINT}' OR hasError = 1)
     ORDER BY timestamp DESC
-    LIMIT 5000
+    LIMIT {limit}
+    """
+
+def _stratified_select(cols: str, inner: str, limits: str):
+    """
+    在 inner（已带 sample_class / sample_key 列）上按层截取：
+    每层按 sample_key 排序保留前 N 条，sample_weight = 层内总数 / 保留数
     """
+    return f"""
+    SELECT {cols}, sample_class, stratum_pop / least(stratum_pop, {limits}) AS sample_weight
+    FROM (
+        SELECT *,
+            count() OVER (PARTITION BY sample_class) AS stratum_pop,
+            row_number() OVER (PARTITION BY sample_class ORDER BY sample_key) AS stratum_rank
+        FROM ({inner})
+    )
+    WHERE stratum_rank <= {limits}
+    """
+
+def sql_logs_sampled(start_ns: int, end_ns: int):
+    inner = f"""
+        SELECT *,
+            if(level IN ('ERROR', 'FATAL') OR exception_type != '', 'error', 'uniform') AS sample_class,
+            toFloat64(cityHash64(time, message)) AS sample_key
+        FROM ({sql_logs_by_ns(start_ns, end_ns, SERVER_SAMPLE_SCAN_LIMIT)})
+    """
+    limits = f"if(sample_class = 'error', {LOG_SAMPLE_ERROR}, {LOG_SAMPLE_UNIFORM})"
+    return _stratified_select(", ".join(LOG_RAW_KEYS), inner, limits) + "ORDER BY time DESC"
+
+def sql_traces_sampled(start_iso: str, end_iso: str):
+    base = sql_traces_best_effort(start_iso, end_iso, SERVER_SAMPLE_SCAN_LIMIT)
+    # tail 只取每个 operation 最慢的 K 条中全局最慢的 TRACE_SAMPLE_TAIL 条（权重恒为 1），
+    # 超出部分归入 uniform 层，避免较快尾部 span 的权重记到最慢的 span 上
+    tail_candidate = f"error = 0 AND op_rank <= {TRACE_SAMPLE_TAIL_PER_OP}"
+    inner = f"""
+        SELECT *,
+            multiIf(error = 1, 'error',
+                    {tail_candidate} AND tail_rank <= {TRACE_SAMPLE_TAIL}, 'tail', 'uniform') AS sample_class,
+            if(sample_class = 'tail', -duration_ms, toFloat64(cityHash64(span_id))) AS sample_key
+        FROM (
+            SELECT *, row_number() OVER (PARTITION BY {tail_candidate} ORDER BY duration_ms DESC) AS tail_rank
+            FROM (
+                SELECT *, row_number() OVER (PARTITION BY error, operation ORDER BY duration_ms DESC) AS op_rank
+                FROM ({base})
+            )
+        )
+    """
+    limits = (f"multiIf(sample_class = 'error', {TRACE_SAMPLE_ERROR}, "
+              f"sample_class = 'tail', {TRACE_SAMPLE_TAIL}, {TRACE_SAMPLE_UNIFORM})")
+    cols = ", ".join(["ts"] + TRACE_RAW_KEYS[1:])
+    return _stratified_select(cols, inner, limits) + "ORDER BY ts DESC"
 
 def _metric_whitelist_where(alias="a"):
     likes = [f"{alias}.metric_name LIKE '{p}'" if '%' in p or '.' in p else f"{alias}.metric_name='{p}'"
@@ -157,14 +223,21 @@ def _metric_whitelist_where(alias="a"):
     return "(" + " OR ".join(likes) + ")"
 
 def sql_metrics_main(window_start_ms: int, window_end_ms: int):
+    """
+    没有 service.name 的 k8s 指标（kubeletstats 的 k8s.pod.cpu_limit_utilization 等）
+    按 k8s.deployment.name / k8s.namespace.name 归到对应服务，避免整个集群合并成一行
+    """
     where_like = _metric_whitelist_where("a")
     return f"""
     SELECT
         ts.metric_name,
+        any(ts.temporality) AS temporality,
         any(md.unit) AS unit,
         any(md.type) AS type,
-        ifNull(ts.resource_attrs['service.name'], '') AS service_name,
-        ifNull(ts.resource_attrs['service.namespace'], '') AS service_namespace,
+        if(ifNull(ts.resource_attrs['service.name'], '') != '', ts.resource_attrs['service.name'],
+           ifNull(ts.resource_attrs['k8s.deployment.name'], '')) AS service_name,
+        if(ifNull(ts.resource_attrs['service.namespace'], '') != '', ts.resource_attrs['service.namespace'],
+           ifNull(ts.resource_attrs['k8s.namespace.name'], '')) AS service_namespace,
         ifNull(ts.resource_attrs['deployment.environment'], '') AS environment,
         ifNull(ts.attrs['operation'], '') AS operation,
         ifNull(ts.attrs['http.status_code'], '') AS http_status,
@@ -215,6 +288,51 @@ def sql_metrics_fallback(window_start_ms: int, window_end_ms: int):
     LIMIT 2000
     """
 
+def sql_metric_series(window_start_ms: int, window_end_ms: int, step_ms: int):
+    """
+    每条序列（fingerprint）一行：offsets 为桶序号，values 为桶内均值；
+    Cumulative 计数器转成相邻桶差值，避免单调递增被误判为变点；
+    差值为负说明计数器重置（如 pod 重启），该桶增量取重置后的当前值
+    """
+    return f"""
+    SELECT metric_name, service_name, fingerprint, offsets, `values`
+    FROM (
+        SELECT
+            s.metric_name AS metric_name,
+            ifNull(l.service_name, '') AS service_name,
+            s.fingerprint AS fingerprint,
+            arraySort(groupArray((s.t, s.v))) AS pts,
+            if(any(s.temporality) = 'Cumulative',
+               arrayPopFront(arrayMap(p -> p.1, pts)),
+               arrayMap(p -> p.1, pts)) AS offsets,
+            arrayMap(p -> p.2, pts) AS vals,
+            if(any(s.temporality) = 'Cumulative',
+               arrayPopFront(arrayMap((d, v) -> if(d < 0, v, d), arrayDifference(vals), vals)),
+               vals) AS `values`
+        FROM (
+            SELECT
+                a.metric_name AS metric_name,
+                a.fingerprint AS fingerprint,
+                any(a.temporality) AS temporality,
+                intDiv(a.unix_milli - {window_start_ms}, {step_ms}) AS t,
+                avg(a.value) AS v
+            FROM {METRIC_DB}.distributed_samples_v4 AS a
+            WHERE a.unix_milli >= {window_start_ms} AND a.unix_milli < {window_end_ms}
+              AND {_metric_whitelist_where("a")}
+            GROUP BY metric_name, fingerprint, t
+        ) AS s
+        LEFT JOIN (
+            SELECT ts.fingerprint AS fingerprint, any(ts.resource_attrs['service.name']) AS service_name
+            FROM {METRIC_DB}.distributed_time_series_v4 AS ts
+            WHERE ts.unix_milli >= {window_start_ms} - 3600000 AND ts.unix_milli < {window_end_ms}
+              AND {_metric_whitelist_where("ts")}
+            GROUP BY fingerprint
+        ) AS l ON s.fingerprint = l.fingerprint
+        GROUP BY metric_name, service_name, fingerprint
+    )
+    LIMIT {METRIC_SERIES_MAX}
+    """
+
 def sql_errors_best_effort(start_iso: str, end_iso: str):
     return f"""
     SELECT
@@ -234,34 +352,59 @@ def sql_errors_best_effort(start_iso: str, end_iso: str):
     """
 
 # ================== DB 健康检查 ==================
-def check_db_connection() -> List[Dict[str, Any]]:
+HEALTH_PROBER = HealthProber(load_probe_config(HEALTH_CONFIG_FILE))
+PROFILER = CycleProfiler('exporter', PROFILE_EVERY_N, PROFILE_SLOW_MS, PROFILE_INTERVAL_MS, PROFILE_TRACEMALLOC_EVERY_N)
+
+def check_db_connection(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
-    测试 MySQL TCP 3306 是否可达，失败则生成 errors 条目
+    DB 探测失败的目标生成 errors 条目
     """
     errors = []
-    db_host = os.getenv("MYSQL_HOST", "192.168.137.108")
-    db_port = int(os.getenv("MYSQL_PORT", 3306))
-    try:
-        s = socket.create_connection((db_host, db_port), timeout=3)
-        s.close()
-    except Exception as e:
+    for r in results:
+        if r["up"]:
+            continue
         errors.append({
-            "timestamp": isoformat(utc_now()),
+            "timestamp": r["checked_at"],
             "service": SERVICE_HINT,
             "trace_id": "",
             "span_id": "",
             "exception_type": "DBConnectionError",
-            "exception_message": f"Cannot connect to MySQL at {db_host}:{db_port} - {e}",
+            "exception_message": f"Cannot connect to {r['target']} at {r['host']}:{r['port']} - {r.get('error')}",
             "exception_stacktrace": ""
         })
     return errors
 
 # ================== 主执行 ==================
-LOG_KEYS = ['time','service','service_instance_id','environment','message','level','host','service_version','logger_name','exception_type','exception_message','thread_name','trace_id','span_id']
-TRACE_KEYS = ['timestamp','service','operation','trace_id','span_id','parent_id','duration_ms','error','status_code','http_status','http_method','http_route','http_url','db_system','db_name','db_operation','peer_service']
-METRIC_KEYS_MAIN = ['metric_name','unit','type','service_name','service_namespace','environment','operation','http_status','span_kind','sample_count','min_value','max_value','avg_last','sum_value','first_seen','last_seen']
-METRIC_KEYS_FALLBACK = ['metric_name','temporality','unit','type','service_name','service_namespace','environment','operation','http_status','span_kind','sample_count','min_value','max_value','avg_last','sum_value','first_seen','last_seen']
-ERROR_KEYS = ['timestamp','service','trace_id','span_id','exception_type','exception_message','exception_stacktrace']
+SCHEMAS = {
+    'logs': compile_schema(LOG_KEYS),
+    'traces': compile_schema(TRACE_KEYS),
+    'logs_raw': compile_schema(LOG_RAW_KEYS),
+    'traces_raw': compile_schema(TRACE_RAW_KEYS),
+    'metrics_main': compile_schema(METRIC_KEYS_MAIN),
+    'metrics_fallback': compile_schema(METRIC_KEYS_FALLBACK),
+    'errors': compile_schema(ERROR_KEYS),
+    'metric_series': compile_schema(METRIC_SERIES_KEYS),
+}
+
+def n_rows(columns) -> int:
+    return len(columns[0]) if columns else 0
+
+def query_with_retry(name: str, sql: str):
+    for attempt in range(MAX_RETRIES):
+        try:
+            return run_ch_query(sql)
+        except Exception as e:
+            sleep_s = RETRY_BASE_SEC * (2 ** attempt)
+            print(f"[WARN] {name} retry {attempt+1} in {sleep_s}s: {e}")
+            time.sleep(sleep_s)
+    return None
+
+def sample_locally(name: str, sql: str, keys, schema, sampler):
+    """服务端采样不可用时：拉取较多原始行，本地分层采样"""
+    cols = query_with_retry(name + '_scan', sql)
+    if cols is None:
+        return []
+    return sampler(columns_to_objs(keys, cols, schema))
 
 def run_once():
     state = load_state()
@@ -285,17 +428,23 @@ def run_once():
     window_end_ms    = int(window_end.timestamp()   * 1000)
 
     seq = mk_seq(window_end)
-    outfile = os.path.join(OUTPUT_DIR, window_end.astimezone(timezone.utc).strftime('aiops_payload_%Y%m%d_%H%M.json.gz'))
+    outfile = os.path.join(OUTPUT_DIR, window_end.astimezone(timezone.utc).strftime('aiops_payload_%Y%m%d_%H%M') + payload_suffix(PAYLOAD_COMPRESSION))
+    PROFILER.set_output(outfile, seq)
 
     queries = {
-        'logs':   (sql_logs_by_ns(window_start_ns, window_end_ns), LOG_KEYS),
-        'traces': (sql_traces_best_effort(window_start_iso, window_end_iso), TRACE_KEYS),
+        'logs':   (sql_logs_sampled(window_start_ns, window_end_ns), LOG_KEYS),
+        'traces': (sql_traces_sampled(window_start_iso, window_end_iso), TRACE_KEYS),
         'metrics_main': (sql_metrics_main(window_start_ms, window_end_ms), METRIC_KEYS_MAIN),
         'errors': (sql_errors_best_effort(window_start_iso, window_end_iso), ERROR_KEYS),
     }
+    series_step_ms = METRIC_SERIES_STEP_SEC * 1000
+    series_start_ms = window_end_ms - METRIC_SERIES_LOOKBACK_SEC * 1000
+    if METRIC_SERIES_ENABLED:
+        queries['metric_series'] = (sql_metric_series(series_start_ms, window_end_ms, series_step_ms), METRIC_SERIES_KEYS)
 
     results: Dict[str, List[List[Any]]] = {}
-    with ThreadPoolExecutor(max_workers=4) as ex:
+    failed = set()
+    with ThreadPoolExecutor(max_workers=len(queries)) as ex:
         futs = {ex.submit(run_ch_query, q): name for name, (q, _) in queries.items()}
         for fut in as_completed(futs):
             name = futs[fut]
@@ -307,6 +456,7 @@ def run_once():
                     retry += 1
                     if retry >= MAX_RETRIES:
                         print(f"[ERROR] Query {name} failed after retries: {e}", file=sys.stderr)
+                        failed.add(name)
                         break
                     sleep_s = RETRY_BASE_SEC * (2 ** (retry-1))
                     print(f"[WARN] Query {name} failed retry {retry} in {sleep_s}s: {e}")
@@ -316,7 +466,7 @@ def run_once():
     # metrics fallback
     metrics_rows = results.get('metrics_main', [])
     use_fallback = False
-    if not metrics_rows:
+    if not n_rows(metrics_rows):
         for attempt in range(MAX_RETRIES):
             try:
                 metrics_rows = run_ch_query(sql_metrics_fallback(window_start_ms, window_end_ms))
@@ -327,8 +477,30 @@ def run_once():
                 print(f"[WARN] metrics_fallback retry {attempt+1} in {sleep_s}s: {e}")
                 time.sleep(sleep_s)
 
+    PROFILER.lap('clickhouse')
+
+    # traces / logs 本地采样兜底
+    sampling = {'logs': 'server', 'traces': 'server'}
+    logs = columns_to_objs(LOG_KEYS, results.get('logs', []), SCHEMAS['logs'])
+    traces = columns_to_objs(TRACE_KEYS, results.get('traces', []), SCHEMAS['traces'])
+    if 'logs' in failed:
+        sampling['logs'] = 'local'
+        logs = sample_locally('logs', sql_logs_by_ns(window_start_ns, window_end_ns, SAMPLE_SCAN_LIMIT),
+                              LOG_RAW_KEYS, SCHEMAS['logs_raw'],
+                              lambda objs: sample_logs(objs, LOG_SAMPLE_ERROR, LOG_SAMPLE_UNIFORM))
+    if 'traces' in failed:
+        sampling['traces'] = 'local'
+        traces = sample_locally('traces', sql_traces_best_effort(window_start_iso, window_end_iso, SAMPLE_SCAN_LIMIT),
+                                TRACE_RAW_KEYS, SCHEMAS['traces_raw'],
+                                lambda objs: sample_spans(objs, TRACE_SAMPLE_ERROR, TRACE_SAMPLE_TAIL_PER_OP,
+                                                          TRACE_SAMPLE_TAIL, TRACE_SAMPLE_UNIFORM))
+
+    PROFILER.lap('convert')
+
     # ================== DB 健康检查 ==================
-    db_errors = check_db_connection()
+    health = HEALTH_PROBER.probe(kinds=("db",))
+    db_errors = check_db_connection(health)
+    PROFILER.lap('health')
 
     payload = {
         "meta": {
@@ -338,15 +510,27 @@ def run_once():
             "service_hint": SERVICE_HINT,
             "metrics_source": "agg_5m_with_labels" if not use_fallback else "agg_5m_fallback_no_labels",
             "seq": seq,
-            "profile": "low-latency"
+            "profile": "low-latency",
+            "sampling": sampling
         },
-        "logs":    rows_to_objs(LOG_KEYS, results.get('logs', [])),
-        "traces":  rows_to_objs(TRACE_KEYS, results.get('traces', [])),
-        "metrics": rows_to_objs(METRIC_KEYS_MAIN if not use_fallback else METRIC_KEYS_FALLBACK, metrics_rows),
-        "errors":  rows_to_objs(ERROR_KEYS, results.get('errors', [])) + db_errors,
+        "logs":    logs,
+        "traces":  traces,
+        "metrics": columns_to_objs(METRIC_KEYS_MAIN, metrics_rows, SCHEMAS['metrics_main']) if not use_fallback
+                   else columns_to_objs(METRIC_KEYS_FALLBACK, metrics_rows, SCHEMAS['metrics_fallback']),
+        "errors":  columns_to_objs(ERROR_KEYS, results.get('errors', []), SCHEMAS['errors']) + db_errors,
+        "health":  health,
     }
+    if METRIC_SERIES_ENABLED:
+        payload["metric_series"] = {
+            "start_ms": series_start_ms,
+            "step_ms": series_step_ms,
+            "series": columns_to_objs(METRIC_SERIES_KEYS, results.get('metric_series', []), SCHEMAS['metric_series']),
+        }
+
+    PROFILER.lap('convert')
 
-    atomic_gzip_write(outfile, payload)
+    atomic_payload_write(outfile, payload, PAYLOAD_COMPRESSION, PAYLOAD_COMPRESS_LEVEL, PAYLOAD_COMPACT)
+    PROFILER.lap('encode_write')
     save_state({"last_success_ts_utc": window_end_iso, "last_seq": seq})
     print(f"[OK] wrote {outfile} logs={len(payload['logs'])} traces={len(payload['traces'])} metrics={len(payload['metrics'])} errors={len(payload['errors'])}")
     return True
@@ -355,7 +539,8 @@ def main_loop():
     print("[START] AIOps data prepare (low-latency profile, thread-safe)")
     while True:
         try:
-            ok = run_once()
+            with PROFILER.cycle():
+                ok = run_once()
         except Exception as e:
             print(f"[FATAL] run_once exception: {e}", file=sys.stderr)
             ok = False
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+变点检测吞吐：N 条序列（默认 10k）× 30 个点（15 分钟窗口 / 30s 步长）
+
+用法: python benchmarks/bench_change_point.py [series] [steps]
+"""
+import os, sys, time, random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detectors import change_point
+from detectors.change_point import ChangePointDetector
+
+
+def gen_payload(n: int, steps: int, shifted: float = 0.01):
+    rnd = random.Random(3)
+    series = []
+    for i in range(n):
+        base = rnd.uniform(0.1, 100)
+        shift_at = rnd.randrange(steps // 2, steps) if rnd.random() < shifted else steps
+        vals = [base * (1 + rnd.gauss(0, 0.02)) * (1.5 if t >= shift_at else 1.0) for t in range(steps)]
+        series.append({"metric_name": f"node_cpu_{i % 50}", "service_name": f"svc-{i % 20}",
+                       "offsets": list(range(steps)), "values": vals})
+    return {"metric_series": {"start_ms": 0, "step_ms": 30000, "series": series}}
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    steps = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    payload = gen_payload(n, steps)
+    print(f"series={n} steps={steps} numpy={'yes' if change_point.np is not None else 'no'}")
+    best = None
+    for _ in range(3):
+        t0 = time.perf_counter()
+        out = ChangePointDetector().detect(payload)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    found = out[0]["evidence"]["change_points"] if out else 0
+    print(f"detect: {best * 1000:.1f} ms, change_points={found}")
+
+
+if __name__ == '__main__':
+    main()
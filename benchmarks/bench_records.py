@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+agent 加载 payload 的端到端对比：dict 模型 vs records（__slots__）模型
+
+- load          : read_payload（gzip 解压 + json.load），两种模型共有的开销
+- dict          : load + 按 .get 扫描 traces（改造前 agent 的做法）
+- records       : load + payload_to_records + 按属性扫描 traces
+每种流程给出耗时（5 次取中位数）、峰值内存与扫描完成后仍存活的内存。
+
+用法: python benchmarks/bench_records.py [rows]
+"""
+import os, sys, time, random, tempfile, statistics, tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from records import TRACE_KEYS, payload_to_records
+from serializer import atomic_payload_write, read_payload
+
+SERVICES = ["newbee-mall", "mysql", "redis", "gateway"]
+OPERATIONS = ["GET /goods/detail", "POST /order", "SELECT goods", "GET /index"]
+
+
+def gen_payload(n: int):
+    rnd = random.Random(42)
+    traces = []
+    for i in range(n):
+        traces.append(dict(zip(TRACE_KEYS, [
+            "2024-01-01T00:00:00+00:00", rnd.choice(SERVICES), rnd.choice(OPERATIONS),
+            "%032x" % rnd.getrandbits(128), "%016x" % rnd.getrandbits(64), "",
+            rnd.expovariate(1 / 120.0), rnd.random() < 0.02, "STATUS_CODE_UNSET", "200",
+            "GET", "/goods/detail", "http://newbee-mall/goods/detail", "mysql", "newbee_mall",
+            "SELECT", "", "uniform", 1.0,
+        ])))
+    return {"meta": {}, "traces": traces, "logs": [], "metrics": [], "errors": []}
+
+
+def scan_get(payload):
+    traces = payload["traces"]
+    durs = [t.get("duration_ms") for t in traces if t.get("duration_ms")]
+    return durs, sum(1 for t in traces if t.get("error"))
+
+
+def scan_attr(payload):
+    traces = payload["traces"]
+    durs = [t.duration_ms for t in traces if t.duration_ms]
+    return durs, sum(1 for t in traces if t.error)
+
+
+PIPELINES = [
+    ("load", lambda path: read_payload(path)),
+    ("dict", lambda path: (lambda p: (scan_get(p), p)[1])(read_payload(path))),
+    ("records", lambda path: (lambda p: (scan_attr(p), p)[1])(payload_to_records(read_payload(path)))),
+]
+
+
+def measure(fn, path):
+    times = []
+    for _ in range(5):
+        t0 = time.perf_counter()
+        fn(path)
+        times.append(time.perf_counter() - t0)
+
+    # 内存单独测：tracemalloc 会把逐对象分配的流程拖慢数倍
+    tracemalloc.start()
+    payload = fn(path)
+    live, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del payload
+    return statistics.median(times), peak, live
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 15000
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "payload.json.gz")
+        atomic_payload_write(path, gen_payload(n), "gzip", 6, True)
+
+        print(f"rows={n}")
+        print(f"{'pipeline':<12}{'time(ms)':>10}{'peak(MB)':>10}{'live(MB)':>10}")
+        for name, fn in PIPELINES:
+            t, peak, live = measure(fn, path)
+            print(f"{name:<12}{t * 1000:>10.1f}{peak / 2**20:>10.1f}{live / 2**20:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+exporter 序列化吞吐：旧版 rows_to_objs + gzip 文本流 vs 列式转换 + 一次性压缩
+
+用法: python benchmarks/bench_serialize.py [rows]
+"""
+import os, sys, io, json, gzip, time, random
+from datetime import datetime, timezone, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from records import TRACE_KEYS
+from serializer import rows_to_objs, columns_to_objs, compile_schema, encode_payload
+
+
+def gen_rows(n: int):
+    rnd = random.Random(7)
+    t0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [[
+        t0 + timedelta(milliseconds=i), "newbee-mall", rnd.choice(["GET /index", "POST /order"]),
+        "%032x" % rnd.getrandbits(128), "%016x" % rnd.getrandbits(64), "",
+        rnd.expovariate(1 / 120.0), rnd.random() < 0.02, "STATUS_CODE_UNSET", "200", "GET",
+        "/index", "http://newbee-mall/index", "", "", "", "",
+    ] for i in range(n)]
+
+
+def old_path(rows):
+    payload = {"traces": rows_to_objs(TRACE_KEYS, rows)}
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as raw, io.TextIOWrapper(raw, encoding='utf-8') as g:
+        json.dump(payload, g, ensure_ascii=False, indent=2)
+    return payload, buf.getvalue()
+
+
+def new_path(columns, convs, compact, level):
+    payload = {"traces": columns_to_objs(TRACE_KEYS, columns, convs)}
+    return payload, gzip.compress(encode_payload(payload, compact), compresslevel=level)
+
+
+def timeit(fn, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return out, best
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 15000
+    rows = gen_rows(n)
+    columns = [list(c) for c in zip(*rows)]
+    convs = compile_schema(TRACE_KEYS)
+
+    (old_payload, old_bytes), t_old = timeit(old_path, rows)
+    print(f"rows={n}")
+    print(f"{'path':<28}{'rows/s':>12}{'bytes':>12}")
+    print(f"{'rows_to_objs+gzip(9) text':<28}{n / t_old:>12.0f}{len(old_bytes):>12}")
+    for compact, level in [(False, 9), (False, 6), (True, 6), (True, 1)]:
+        (payload, data), t = timeit(new_path, columns, convs, compact, level)
+        assert payload == old_payload
+        if not compact:
+            assert gzip.decompress(data) == gzip.decompress(old_bytes)
+        name = f"columns+{'compact' if compact else 'indent2'}+gzip({level})"
+        print(f"{name:<28}{n / t:>12.0f}{len(data):>12}")
+
+
+if __name__ == '__main__':
+    main()
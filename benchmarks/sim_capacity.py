@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扩容策略离线回放：容量模型（CapacityModel.recommend） vs 现有的每周期 +1
+
+负载序列来自录制的 payload（目录下 *.json.gz / *.json.zst，按文件名排序），
+用 --replicas 给出录制时的副本数以拟合单副本吞吐与基础延迟；
+没有 payload 时使用合成的突增负载。
+两种策略在同一个 M/M/1 世界里闭环运行：副本变更下一个周期生效，
+超出容量的请求不被服务（观测到的 rps 只是已服务部分）。
+
+输出：每次 SLO 违约的恢复周期数（time-to-recover）、违约周期总数、副本·周期成本
+
+用法:
+  python benchmarks/sim_capacity.py                        # 合成突增
+  python benchmarks/sim_capacity.py <payload_dir> <service> --replicas 3 [--slo 1000]
+"""
+import os, sys, glob, argparse
+from datetime import datetime, timezone, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from capacity import AGG_STEP_SEC, CapacityModel, observe_payload
+from records import payload_to_records
+from serializer import read_payload
+
+CYCLE_SEC = 30
+SPANS_PER_CYCLE = 50
+CPU_SATURATION = 0.8
+
+
+def synthetic_load(cycles: int = 60):
+    """基线 20 rps，第 10 个周期突增到 120 rps，第 40 个周期回落到 60 rps"""
+    return [20.0 if i < 10 else 120.0 if i < 40 else 60.0 for i in range(cycles)]
+
+
+def replay_load(path: str, service: str, replicas: int):
+    """返回 (负载序列, 单副本吞吐, 基础延迟)"""
+    files = sorted(f for ext in ("*.json.gz", "*.json.zst")
+                   for f in glob.glob(os.path.join(path, ext)))
+    model = CapacityModel(history=len(files) or 1)
+    load = []
+    for fn in files:
+        payload = payload_to_records(read_payload(fn))
+        o = observe_payload(payload).get(service)
+        if o:
+            load.extend(o["rps_series"])
+        model.observe(payload, {service: replicas})
+    return load, model.per_replica_rps(service), model.base_latency_ms(service)
+
+
+class World:
+    """单服务 M/M/1：p95 = base / (1 - util)"""
+
+    def __init__(self, per_replica: float, base_ms: float):
+        self.per_replica = per_replica
+        self.base_ms = base_ms
+
+    def step(self, demand: float, replicas: int):
+        cap = replicas * self.per_replica
+        served = min(demand, cap * 0.99)
+        util = served / cap if cap else 0.99
+        return served, util, self.base_ms / (1.0 - util)
+
+
+def make_payload(service: str, t: datetime, served: float, util: float, p95: float,
+                 replicas: int):
+    """
+    按 exporter 的 payload 形状构造一个周期的观测：根 span 带 sample_weight，
+    指标只用 exporter 白名单内的名字：节点 CPU 累计计数器（无服务标签）、
+    kubeletstats 利用率 gauge（sql_metrics_main 按 k8s.deployment.name 归到服务）、
+    http 直方图的 _count 序列（Delta，一个 agg_5m 桶，sum_value 为请求数，
+    sample_count 只是聚合的样本数）
+    """
+    w = served * CYCLE_SEC / SPANS_PER_CYCLE
+    step = CYCLE_SEC / SPANS_PER_CYCLE
+    start = t.isoformat()
+    end = (t + timedelta(seconds=CYCLE_SEC)).isoformat()
+    return payload_to_records({
+        "meta": {"service_hint": service, "window": {"duration_sec": CYCLE_SEC}},
+        "traces": [{
+            "service": service,
+            "timestamp": (t + timedelta(seconds=i * step)).isoformat(),
+            "duration_ms": p95,
+            "parent_id": "",
+            "sample_weight": w,
+        } for i in range(SPANS_PER_CYCLE)],
+        "metrics": [
+            {"metric_name": "node_cpu_seconds_total", "temporality": "Cumulative", "unit": "s", "type": "Sum",
+             "service_name": "", "sample_count": CYCLE_SEC, "avg_last": 123456.0 + t.timestamp() * replicas,
+             "first_seen": start, "last_seen": end},
+            {"metric_name": "k8s.pod.cpu_limit_utilization", "temporality": "Unspecified", "unit": "1",
+             "type": "Gauge", "service_name": service, "sample_count": replicas, "avg_last": util,
+             "first_seen": start, "last_seen": end},
+            {"metric_name": "http.server.request.duration.count", "temporality": "Delta", "unit": "1",
+             "type": "Sum", "service_name": service, "sample_count": 10,
+             "sum_value": served * AGG_STEP_SEC, "first_seen": start, "last_seen": start},
+        ],
+    })
+
+
+def simulate(policy: str, load, world: World, service: str, start: int, slo_ms: float,
+             min_replicas: int, max_scale: int):
+    model = CapacityModel()
+    replicas = start
+    t = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    violations, cost, recover, onset = 0, 0, [], None
+    for i, demand in enumerate(load):
+        served, util, p95 = world.step(demand, replicas)
+        cost += replicas
+        bad = p95 > slo_ms or served < demand
+        if bad:
+            violations += 1
+            if onset is None:
+                onset = i
+        elif onset is not None:
+            recover.append(i - onset)
+            onset = None
+
+        if policy == "plus1":
+            # 现状：出现 HIGH_LATENCY / CPU_SATURATION 时建议 +1，从不缩容
+            if bad or util > CPU_SATURATION:
+                replicas = min(replicas + 1, max_scale)
+        else:
+            model.observe(make_payload(service, t, served, util, p95, replicas), {service: replicas})
+            rec = model.recommend(service, replicas, slo_ms, min_replicas, max_scale)
+            if rec:
+                replicas = rec["target"]
+        t += timedelta(seconds=CYCLE_SEC)
+    if onset is not None:
+        recover.append(None)
+    return {"violations": violations, "replica_cycles": cost, "time_to_recover": recover}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("payload_dir", nargs="?")
+    ap.add_argument("service", nargs="?", default="newbee-mall")
+    ap.add_argument("--replicas", type=int, default=3, help="录制 payload 时的副本数 / 模拟初始副本数")
+    ap.add_argument("--slo", type=float, default=1000)
+    ap.add_argument("--min-replicas", type=int, default=1)
+    ap.add_argument("--max-scale", type=int, default=20)
+    ap.add_argument("--per-replica", type=float, default=10.0, help="合成模式下的单副本吞吐")
+    ap.add_argument("--base-ms", type=float, default=200.0, help="合成模式下的基础延迟")
+    args = ap.parse_args()
+
+    if args.payload_dir:
+        load, per_replica, base_ms = replay_load(args.payload_dir, args.service, args.replicas)
+        if not load or not per_replica:
+            sys.exit(f"no usable observations for {args.service} in {args.payload_dir}")
+        base_ms = base_ms or args.base_ms
+        print(f"replayed {len(load)} points: per_replica={per_replica:.2f} rps base={base_ms:.1f}ms")
+    else:
+        load, per_replica, base_ms = synthetic_load(), args.per_replica, args.base_ms
+        print(f"synthetic surge: {len(load)} cycles, per_replica={per_replica} rps base={base_ms}ms")
+
+    world = World(per_replica, base_ms)
+    for policy in ("plus1", "model"):
+        r = simulate(policy, load, world, args.service, args.replicas, args.slo,
+                     args.min_replicas, args.max_scale)
+        ttr = ", ".join("unrecovered" if x is None else str(x) for x in r["time_to_recover"]) or "-"
+        print(f"{policy:>6}: time_to_recover(cycles)=[{ttr}] "
+              f"slo_violations={r['violations']} replica_cycles={r['replica_cycles']}")
+
+
+if __name__ == "__main__":
+    main()
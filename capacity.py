@@ -0,0 +1,186 @@
+# capacity.py
+"""
+容量模型：按服务拟合吞吐 / 延迟曲线，给出满足延迟 SLO 所需的副本数
+
+每个 payload 观测一次（observe），按服务累积历史：
+- 负载：入口 span（parent_id 为空）按 sample_weight 加权计数得到 rps（长窗口按分钟成序列）；
+  无 trace 时退化为 http 直方图 _count 序列（Delta）的 sum_value / 覆盖时长；
+  agg_5m 的 sample_count 是聚合的样本数而非请求数，不能当作请求量
+- 利用率：该服务的 CPU 利用率 gauge（如 k8s.pod.cpu_limit_utilization，exporter 按
+  k8s.deployment.name 归到服务）的 avg_last；无服务标签的行是整个集群 / 节点的，
+  不参与拟合。没有可用利用率时不给出建议（沿用 +1）
+- 延迟：加权 p95
+拟合：
+- 单副本吞吐  per_replica = rps / (replicas * util)          （满载时单副本 rps）
+- 延迟曲线    p95 = base / (1 - util)                         （M/M/1 近似，最小二乘求 base）
+- 目标利用率  u* = 1 - base / (slo * SLO_HEADROOM)            （留余量，夹在 [MIN_UTIL, MAX_UTIL]）
+- 负载预测    Holt 双指数平滑，预测下一个窗口的 rps
+副本数 = ceil(forecast / (per_replica * u*))，并受 min_replicas / max_scale 约束
+- 饱和时观测到的只是已服务的请求，真实负载未知：至少按 SATURATED_GROWTH 倍扩容
+- 缩容取最近 DOWNSCALE_WINDOW 次建议的最大值，避免预测回落时来回抖动
+"""
+import math
+from collections import defaultdict, deque
+from typing import Dict, Any, List, Optional
+
+from correlator import to_epoch
+from records import cpu_utilization
+from sampling import sample_weight, weighted_quantile
+
+HISTORY = 60
+MIN_UTIL = 0.2
+MAX_UTIL = 0.85
+SLO_HEADROOM = 0.8
+HOLT_ALPHA = 0.5
+HOLT_BETA = 0.3
+SATURATED_UTIL = 0.95
+SATURATED_GROWTH = 2.0
+DOWNSCALE_WINDOW = 5
+AGG_STEP_SEC = 300  # samples_v4_agg_5m 的聚合粒度
+
+
+def holt_forecast(xs: List[float], steps: float = 1.0) -> float:
+    if not xs:
+        return 0.0
+    level, trend = xs[0], 0.0
+    for x in xs[1:]:
+        prev = level
+        level = HOLT_ALPHA * x + (1 - HOLT_ALPHA) * (level + trend)
+        trend = HOLT_BETA * (level - prev) + (1 - HOLT_BETA) * trend
+    return max(0.0, level + trend * steps)
+
+
+def request_rate(m) -> Optional[float]:
+    """
+    http 直方图 _count 序列在其覆盖时段内的请求速率（rps）。
+    只用 Delta：sum_value 即请求数；Cumulative 行聚合了多条序列的累计值，无法求差，返回 None
+    """
+    name = (m.metric_name or "").lower()
+    if not name.startswith("http.") or not name.endswith((".count", "_count")):
+        return None
+    if (m.temporality or "").lower() != "delta" or m.sum_value is None:
+        return None
+    lo, hi = to_epoch(m.first_seen), to_epoch(m.last_seen)
+    if lo is None or hi is None:
+        return None
+    return m.sum_value / (hi - lo + AGG_STEP_SEC)
+
+
+def observe_payload(payload: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """从单个 payload（各段已转换为 records）提取各服务的负载 / 利用率 / 延迟观测"""
+    window_sec = (payload.get("meta", {}).get("window", {}).get("duration_sec")) or 60
+    by_svc = defaultdict(lambda: {"buckets": defaultdict(float), "durs": [], "weights": [], "roots": 0})
+
+    for t in payload.get("traces", []):
+        svc = t.service
+        if not svc:
+            continue
+        o = by_svc[svc]
+        w = sample_weight(t)
+        if t.duration_ms:
+            o["durs"].append(t.duration_ms)
+            o["weights"].append(w)
+        if not t.parent_id:
+            e = to_epoch(t.timestamp)
+            if e is not None:
+                o["buckets"][int(e // 60)] += w
+                o["roots"] += 1
+
+    http_rps = defaultdict(float)
+    cpu = defaultdict(list)
+    for m in payload.get("metrics", []):
+        svc = m.service_name
+        if not svc:
+            continue
+        r = request_rate(m)
+        if r is not None:
+            http_rps[svc] += r
+            continue
+        u = cpu_utilization(m)
+        if u is not None:
+            # 避开 1 / (1 - util) 的奇点
+            cpu[svc].append(min(max(u, 0.01), 0.99))
+
+    out = {}
+    for svc in set(by_svc) | set(http_rps):
+        o = by_svc.get(svc)
+        if o and o["roots"]:
+            rps = sum(o["buckets"].values()) / window_sec
+            # 长窗口拆成分钟序列（去掉首尾不完整的分钟），短窗口直接用整体 rps
+            keys = sorted(o["buckets"])[1:-1]
+            series = [o["buckets"][k] / 60.0 for k in keys] if len(keys) >= 2 else [rps]
+        elif http_rps.get(svc):
+            rps = http_rps[svc]
+            series = [rps]
+        else:
+            continue
+        utils = cpu.get(svc)
+        out[svc] = {
+            "rps": rps,
+            "rps_series": series,
+            "util": sum(utils) / len(utils) if utils else None,
+            "p95_ms": weighted_quantile(o["durs"], o["weights"], 0.95) if o and o["durs"] else None,
+        }
+    return out
+
+
+class CapacityModel:
+    def __init__(self, history: int = HISTORY):
+        self.history = history
+        self.obs: Dict[str, deque] = defaultdict(lambda: deque(maxlen=self.history))
+        self.load: Dict[str, deque] = defaultdict(lambda: deque(maxlen=self.history))
+        self.needs: Dict[str, deque] = defaultdict(lambda: deque(maxlen=DOWNSCALE_WINDOW))
+
+    def observe(self, payload: Dict[str, Any], replicas: Dict[str, int]):
+        for svc, o in observe_payload(payload).items():
+            self.load[svc].extend(o["rps_series"])
+            r = replicas.get(svc)
+            if r and o["util"] is not None:
+                self.obs[svc].append({"rps": o["rps"], "util": o["util"], "p95_ms": o["p95_ms"], "replicas": r})
+
+    # ---------- 拟合 ----------
+    def per_replica_rps(self, svc: str) -> Optional[float]:
+        """满载（util=1）时单副本吞吐，取历史观测的中位数"""
+        vals = sorted(o["rps"] / (o["replicas"] * o["util"]) for o in self.obs[svc] if o["rps"] > 0)
+        return vals[len(vals) // 2] if vals else None
+
+    def base_latency_ms(self, svc: str) -> Optional[float]:
+        """p95 = base / (1 - util) 过原点最小二乘"""
+        pts = [(1.0 / (1.0 - o["util"]), o["p95_ms"]) for o in self.obs[svc] if o["p95_ms"]]
+        sxx = sum(x * x for x, _ in pts)
+        return sum(x * y for x, y in pts) / sxx if sxx else None
+
+    def forecast_rps(self, svc: str) -> float:
+        xs = list(self.load[svc])
+        return max(holt_forecast(xs), xs[-1] if xs else 0.0)
+
+    # ---------- 建议 ----------
+    def recommend(self, svc: str, current: int, slo_ms: float,
+                  min_replicas: int = 1, max_replicas: int = 10) -> Optional[Dict[str, Any]]:
+        per_replica = self.per_replica_rps(svc)
+        if not per_replica:
+            return None
+        base = self.base_latency_ms(svc)
+        target_util = MAX_UTIL if not base else min(MAX_UTIL, max(MIN_UTIL, 1.0 - base / (slo_ms * SLO_HEADROOM)))
+        forecast = self.forecast_rps(svc)
+        need = math.ceil(forecast / (per_replica * target_util)) if forecast > 0 else min_replicas
+        last = self.obs[svc][-1]
+        saturated = last["util"] >= SATURATED_UTIL
+        if saturated:
+            need = max(need, math.ceil(last["replicas"] * SATURATED_GROWTH))
+        self.needs[svc].append(need)
+        if need < current:
+            need = min(current, max(self.needs[svc]))
+        target = min(max(need, min_replicas), max_replicas)
+        return {
+            "service": svc,
+            "current": current,
+            "target": target,
+            "forecast_rps": round(forecast, 3),
+            "per_replica_rps": round(per_replica, 3),
+            "target_util": round(target_util, 3),
+            "base_latency_ms": round(base, 3) if base else None,
+            "slo_ms": slo_ms,
+            "saturated": saturated,
+            "bounded": need != target
+        }
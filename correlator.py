@@ -1,19 +1,171 @@
 # correlator.py
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from records import cpu_utilization
+
+BUCKET_SEC = 60
+SLOW_SPAN_MS = 1000
+CPU_SATURATION = 0.8
+
+# 检测类型 -> 相关的信号对
+RELEVANT_PAIRS = {
+    "HIGH_LATENCY": ("high_latency",),
+    "CPU_SATURATION": ("cpu_saturation",),
+    "ERROR_SPIKE": ("error_spans", "error_logs", "errors"),
+}
+
+
+def to_epoch(v):
+    if v is None or v == "":
+        return None
+    if isinstance(v, (int, float)):
+        return float(v)
+    try:
+        dt = datetime.fromisoformat(v)
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class CrossSignalIndex:
+    """
+    把 metrics / traces / logs / errors 按 (service, 时间桶) 归档，
+    每个信号在每个服务下是一个有序的桶编号数组，信号间用归并求交集。
+    整体开销与 payload 行数线性相关（排序只针对去重后的桶）。
+    """
+
+    def __init__(self, ctx, bucket_sec: int = BUCKET_SEC):
+        self.bucket_sec = bucket_sec
+        # signal -> service -> set(bucket)
+        cells = defaultdict(lambda: defaultdict(set))
+
+        for t in ctx.get("traces", []):
+            b = self._bucket(t.timestamp)
+            if b is None:
+                continue
+            svc = t.service or ""
+            if t.error:
+                cells["error_spans"][svc].add(b)
+            if (t.duration_ms or 0) > SLOW_SPAN_MS:
+                cells["high_latency"][svc].add(b)
+            cells["traffic"][svc].add(b)
+
+        for l in ctx.get("logs", []):
+            if l.level not in ("ERROR", "FATAL"):
+                continue
+            b = self._bucket(l.time)
+            if b is not None:
+                cells["error_logs"][l.service or ""].add(b)
+
+        # errors 段混有 agent 追加的 Pod / DB 异常 dict，这里保留 .get
+        for e in ctx.get("errors", []):
+            b = self._bucket(e.get("timestamp"))
+            if b is not None:
+                cells["errors"][e.get("service") or ""].add(b)
+
+        # signal -> service -> sorted list(bucket)
+        self.series = {
+            sig: {svc: sorted(bs) for svc, bs in by_svc.items()}
+            for sig, by_svc in cells.items()
+        }
+        self._add_metric_intervals(ctx.get("metrics", []))
+
+    def _bucket(self, ts):
+        e = to_epoch(ts)
+        return None if e is None else int(e // self.bucket_sec)
+
+    def _add_metric_intervals(self, metrics):
+        """
+        metric 行是 [first_seen, last_seen] 区间内的聚合值：
+        在该服务有流量的桶数组上二分定位区间，标记饱和桶。
+        无 service_name 的（node_* 等）视为作用于所有服务。
+        """
+        traffic = self.series.get("traffic", {})
+        sat = defaultdict(set)
+        for m in metrics:
+            # 只认 CPU 利用率 gauge；node_cpu_seconds_total 等计数器会把所有桶都标成饱和
+            u = cpu_utilization(m)
+            if u is None or u <= CPU_SATURATION:
+                continue
+            lo, hi = self._bucket(m.first_seen), self._bucket(m.last_seen)
+            if lo is None or hi is None:
+                continue
+            svc = m.service_name or ""
+            for target in ([svc] if svc else list(traffic)):
+                bs = traffic.get(target, [])
+                sat[target].update(bs[bisect_left(bs, lo):bisect_right(bs, hi)])
+        self.series["cpu_saturation"] = {svc: sorted(bs) for svc, bs in sat.items()}
+
+    # ---------- 共现评分 ----------
+    @staticmethod
+    def _overlap(a, b) -> int:
+        """两个有序桶数组的归并求交"""
+        i = j = n = 0
+        while i < len(a) and j < len(b):
+            if a[i] == b[j]:
+                n += 1
+                i += 1
+                j += 1
+            elif a[i] < b[j]:
+                i += 1
+            else:
+                j += 1
+        return n
+
+    def co_occurrence(self, signals=None):
+        """
+        对每个服务、每对信号计算 Jaccard = |A∩B| / |A∪B|（按桶），
+        返回按得分降序的列表
+        """
+        names = sorted(s for s in self.series if s != "traffic" and (signals is None or s in signals))
+        out = []
+        for i, a in enumerate(names):
+            for b in names[i + 1:]:
+                sa, sb = self.series[a], self.series[b]
+                for svc in sa.keys() & sb.keys():
+                    inter = self._overlap(sa[svc], sb[svc])
+                    if not inter:
+                        continue
+                    union = len(sa[svc]) + len(sb[svc]) - inter
+                    out.append({
+                        "service": svc,
+                        "signals": [a, b],
+                        "score": round(inter / union, 3),
+                        "buckets": inter,
+                        "bucket_sec": self.bucket_sec
+                    })
+        out.sort(key=lambda x: (-x["score"], -x["buckets"]))
+        return out
+
+
 class Correlator:
     def run(self, ctx, detections):
         traces = ctx.get("traces", [])
         logs = ctx.get("logs", [])
 
-        trace_index = {t["trace_id"]: t for t in traces if t.get("trace_id")}
+        trace_index = {t.trace_id: t for t in traces if t.trace_id}
 
+        related = []
+        for l in logs:
+            tid = l.trace_id
+            if tid and tid in trace_index:
+                related.append({
+                    "trace": trace_index[tid],
+                    "log": l
+                })
+                if len(related) >= 20:
+                    break
+
+        index = CrossSignalIndex(ctx)
+        scores = index.co_occurrence()
         for d in detections:
-            related = []
-            for l in logs:
-                tid = l.get("trace_id")
-                if tid and tid in trace_index:
-                    related.append({
-                        "trace": trace_index[tid],
-                        "log": l
-                    })
-            d["correlations"] = related[:20]
+            d["correlations"] = list(related)
+            wanted = RELEVANT_PAIRS.get(d["type"])
+            d["co_occurrence"] = [
+                s for s in scores if wanted is None or any(sig in wanted for sig in s["signals"])
+            ][:10]
         return detections
@@ -3,12 +3,19 @@ import uuid
 from datetime import datetime, timezone
 from typing import Dict, Any, List
 
+from records import as_jsonable
+
 
 def now_utc():
     return datetime.now(timezone.utc).isoformat()
 
 
 class Decision:
+    __slots__ = (
+        "decision_id", "timestamp", "service", "state", "anomalies",
+        "rca", "recommendations", "execution"
+    )
+
     def __init__(
         self,
         service: str,
@@ -49,7 +56,7 @@ class Decision:
             "timestamp": self.timestamp,
             "service": self.service,
             "state": self.state,
-            "anomalies": self.anomalies,
+            "anomalies": as_jsonable(self.anomalies),
             "rca": self.rca,
             "recommendations": self.recommendations,
             "execution": self.execution
@@ -1,9 +1,11 @@
 from .error_spike import ErrorSpikeDetector
 from .latency import LatencyDetector
 from .saturation import SaturationDetector
+from .change_point import ChangePointDetector
 
 __all__ = [
     "ErrorSpikeDetector",
     "LatencyDetector",
     "SaturationDetector",
+    "ChangePointDetector",
 ]
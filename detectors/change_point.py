@@ -0,0 +1,168 @@
+# detectors/change_point.py
+"""
+指标序列变点检测（双边 CUSUM）
+
+输入为 exporter 的 metric_series 段：每条序列是 (offsets, values) 紧凑数组，
+时间 = start_ms + offset * step_ms。以窗口前段为基线做标准化，
+S+ / S- 超过阈值即报警，变点位置取报警前累积量最后一次归零处。
+有 numpy 时按时间步对全部序列做向量化计算，否则逐序列计算。
+"""
+import math
+from datetime import datetime, timezone
+
+from records import Anomaly
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖
+    np = None
+
+CUSUM_K = 0.5        # 允许的漂移（以基线标准差为单位）
+CUSUM_H = 5.0        # 报警阈值
+BASELINE_FRAC = 0.3  # 窗口前 30% 作为基线
+MIN_POINTS = 8
+TOP_N = 10
+
+
+def _baseline_len(n: int) -> int:
+    return max(3, int(n * BASELINE_FRAC))
+
+
+def _sigma(mu: float, sd: float) -> float:
+    # 近似常量的序列用相对下限，避免微小波动被放大
+    return max(sd, 0.05 * abs(mu), 1e-9)
+
+
+def _dense(series, n_steps):
+    """offsets/values -> 长度 n_steps 的稠密序列（缺失值前向填充）"""
+    offsets, values = series["offsets"], series["values"]
+    # 常见情况：无缺失点，直接使用
+    if len(offsets) == n_steps and offsets[-1] == n_steps - 1 and None not in values:
+        return values
+    row = [None] * n_steps
+    for o, v in zip(offsets, values):
+        if 0 <= o < n_steps and v is not None and v == v:
+            row[o] = float(v)
+    last = next((v for v in row if v is not None), None)
+    for i, v in enumerate(row):
+        if v is None:
+            row[i] = last
+        else:
+            last = v
+    return row if last is not None else None
+
+
+def cusum_one(xs):
+    """返回 (onset_index, alarm_index, direction) 或 None"""
+    b = _baseline_len(len(xs))
+    base = xs[:b]
+    mu = math.fsum(base) / b
+    sd = math.sqrt(math.fsum((x - mu) * (x - mu) for x in base) / b)
+    sigma = _sigma(mu, sd)
+    sp = sn = 0.0
+    zp = zn = b
+    inv = 1.0 / sigma
+    for i in range(b, len(xs)):
+        z = (xs[i] - mu) * inv
+        sp += z - CUSUM_K
+        if sp <= 0.0:
+            sp = 0.0
+            zp = i + 1
+        elif sp > CUSUM_H:
+            return zp, i, 1
+        sn -= z + CUSUM_K
+        if sn <= 0.0:
+            sn = 0.0
+            zn = i + 1
+        elif sn > CUSUM_H:
+            return zn, i, -1
+    return None
+
+
+def cusum_matrix(X):
+    """
+    numpy 版：X 形状 (n_series, n_steps)。
+    返回 onset / alarm（未报警为 -1）/ direction 三个数组
+    """
+    n, t = X.shape
+    b = _baseline_len(t)
+    mu = X[:, :b].mean(axis=1)
+    sigma = np.maximum(np.maximum(X[:, :b].std(axis=1), 0.05 * np.abs(mu)), 1e-9)
+    Z = (X - mu[:, None]) / sigma[:, None]
+
+    sp = np.zeros(n); sn = np.zeros(n)
+    zp = np.full(n, b); zn = np.full(n, b)
+    alarm = np.full(n, -1); onset = np.full(n, -1); direction = np.zeros(n, dtype=int)
+    for i in range(b, t):
+        sp = np.maximum(0.0, sp + Z[:, i] - CUSUM_K)
+        sn = np.maximum(0.0, sn - Z[:, i] - CUSUM_K)
+        zp = np.where(sp == 0.0, i + 1, zp)
+        zn = np.where(sn == 0.0, i + 1, zn)
+        fresh = alarm < 0
+        up = fresh & (sp > CUSUM_H)
+        down = fresh & ~up & (sn > CUSUM_H)
+        alarm = np.where(up | down, i, alarm)
+        onset = np.where(up, zp, np.where(down, zn, onset))
+        direction = np.where(up, 1, np.where(down, -1, direction))
+    return onset, alarm, direction
+
+
+class ChangePointDetector:
+    def detect(self, ctx):
+        ms = ctx.get("metric_series") or {}
+        series = ms.get("series", [])
+        step_ms = ms.get("step_ms")
+        start_ms = ms.get("start_ms")
+        if not series or not step_ms:
+            return []
+        n_steps = max((max(s["offsets"]) + 1 for s in series if s.get("offsets")), default=0)
+        if n_steps < MIN_POINTS:
+            return []
+
+        idx, rows = [], []
+        for i, s in enumerate(series):
+            row = _dense(s, n_steps)
+            if row is not None:
+                idx.append(i)
+                rows.append(row)
+        if not rows:
+            return []
+
+        hits = []
+        if np is not None:
+            X = np.asarray(rows, dtype=float)
+            onset, alarm, direction = cusum_matrix(X)
+            for j in np.nonzero(alarm >= 0)[0]:
+                hits.append((idx[j], rows[j], int(onset[j]), int(direction[j])))
+        else:
+            for i, row in zip(idx, rows):
+                r = cusum_one(row)
+                if r:
+                    hits.append((i, row, r[0], r[2]))
+
+        if not hits:
+            return []
+
+        points = []
+        for i, row, on, d in hits:
+            b = _baseline_len(len(row))
+            before = sum(row[:b]) / b
+            after_vals = row[on:] or row[-1:]
+            after = sum(after_vals) / len(after_vals)
+            s = series[i]
+            points.append({
+                "metric_name": s.get("metric_name"),
+                "service_name": s.get("service_name", ""),
+                "onset": datetime.fromtimestamp((start_ms + on * step_ms) / 1000, timezone.utc).isoformat(),
+                "direction": "up" if d > 0 else "down",
+                "magnitude": after - before,
+                "relative": (after - before) / abs(before) if before else None
+            })
+        points.sort(key=lambda p: abs(p["relative"]) if p["relative"] is not None else 0, reverse=True)
+
+        top_rel = abs(points[0]["relative"] or 0)
+        return [Anomaly(
+            type="METRIC_CHANGE_POINT",
+            score=min(1.0, 0.5 + top_rel / 2),
+            evidence={"series": len(rows), "change_points": len(points), "top": points[:TOP_N]}
+        )]
@@ -1,15 +1,20 @@
 # detectors/error_spike.py
+from records import Anomaly
+from sampling import weighted_count
+
+
 class ErrorSpikeDetector:
     def detect(self, ctx):
         errors = ctx.get("errors", [])
         logs = ctx.get("logs", [])
 
-        error_count = len(errors) + sum(1 for l in logs if l.get("level") == "ERROR")
+        # 日志为分层采样结果，按 sample_weight 计数
+        error_count = len(errors) + round(weighted_count(logs, lambda l: l.level == "ERROR"))
 
         if error_count >= 10:
-            return [{
-                "type": "ERROR_SPIKE",
-                "score": min(1.0, error_count / 50),
-                "evidence": {"error_count": error_count}
-            }]
+            return [Anomaly(
+                type="ERROR_SPIKE",
+                score=min(1.0, error_count / 50),
+                evidence={"error_count": error_count}
+            )]
         return []
@@ -1,19 +1,28 @@
 # detectors/latency.py
 import statistics
 
+from records import Anomaly
+from sampling import sample_weight, weighted_quantile
+
 class LatencyDetector:
     def detect(self, ctx):
         traces = ctx.get("traces", [])
-        durs = [t["duration_ms"] for t in traces if t.get("duration_ms")]
+        sampled = [t for t in traces if t.duration_ms]
+        durs = [t.duration_ms for t in sampled]
 
         if len(durs) < 10:
             return []
 
-        p95 = statistics.quantiles(durs, n=20)[18]
+        # 分层采样的 payload 按 sample_weight 还原整个窗口的分布
+        weights = [sample_weight(t) for t in sampled]
+        if any(w != 1.0 for w in weights):
+            p95 = weighted_quantile(durs, weights, 0.95)
+        else:
+            p95 = statistics.quantiles(durs, n=20)[18]
         if p95 > 1000:
-            return [{
-                "type": "HIGH_LATENCY",
-                "score": min(1.0, p95 / 5000),
-                "evidence": {"p95_ms": p95}
-            }]
+            return [Anomaly(
+                type="HIGH_LATENCY",
+                score=min(1.0, p95 / 5000),
+                evidence={"p95_ms": p95}
+            )]
         return []
@@ -0,0 +1,201 @@
+# health.py
+"""
+健康探测调度（agent 与 exporter 共用）
+
+- 探测目标来自配置（agent_config.json 的 health_probes 段），支持多集群 / 多命名空间
+- 有界并发 + 随机抖动，避免同时打满 kube-apiserver / DB
+- 结果带 TTL 缓存在本地状态文件中，两个进程通过文件锁去重：
+  锁内只读取状态并认领过期的目标，探测在锁外进行，完成后再加锁合并写回；
+  已被另一进程认领、仍在探测中的目标直接使用上一次的结果
+- 数据库地址可用 MYSQL_HOST / MYSQL_PORT 覆盖（优先于配置文件）
+- 每条结果记录 up/down 与连接耗时，供 RCA 作为证据
+"""
+import os, json, time, random, socket, fcntl, subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Any, List
+
+DEFAULT_STATUS_FILE = "/tmp/aiops_health_status.json"
+# 认领的有效期 = 探测超时 + 抖动 + 该余量（kubectl 额外有 2s），过期视为认领进程已退出
+CLAIM_GRACE_SEC = 5
+
+
+def default_probe_config() -> Dict[str, Any]:
+    return {
+        "max_parallel": 8,
+        "jitter_sec": 0.5,
+        "ttl_sec": 20,
+        "timeout_sec": 3,
+        "status_file": DEFAULT_STATUS_FILE,
+        "pods": [
+            {"name": "newbee-mall", "namespace": "newbee-mall", "desired_replicas": 3},
+        ],
+        "databases": [
+            {
+                "name": "mysql",
+                "host": os.getenv("MYSQL_HOST", "192.168.137.108"),
+                "port": int(os.getenv("MYSQL_PORT", 3306)),
+            },
+        ],
+    }
+
+
+def load_probe_config(path: str) -> Dict[str, Any]:
+    """读取配置文件中的 health_probes 段，缺省项用默认值补齐"""
+    cfg = default_probe_config()
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            cfg.update(json.load(f).get("health_probes", {}))
+    # 现有部署通过环境变量指定 MySQL，配置文件中的同名条目不能覆盖它
+    for db in cfg.get("databases", []):
+        if db.get("name") == "mysql":
+            if os.getenv("MYSQL_HOST"):
+                db["host"] = os.getenv("MYSQL_HOST")
+            if os.getenv("MYSQL_PORT"):
+                db["port"] = int(os.getenv("MYSQL_PORT"))
+    return cfg
+
+
+def pod_key(t: Dict[str, Any]) -> str:
+    return f"pod:{t.get('context', '')}/{t['namespace']}/{t['name']}"
+
+
+def db_key(t: Dict[str, Any]) -> str:
+    return f"db:{t['host']}:{t['port']}"
+
+
+def _utc_iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+class HealthProber:
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.status_file = config.get("status_file", DEFAULT_STATUS_FILE)
+        self.ttl = config.get("ttl_sec", 20)
+        self.timeout = config.get("timeout_sec", 3)
+
+    # ---------- 单个探测 ----------
+    def _jitter(self):
+        j = self.config.get("jitter_sec", 0)
+        if j > 0:
+            time.sleep(random.uniform(0, j))
+
+    def probe_db(self, t: Dict[str, Any]) -> Dict[str, Any]:
+        self._jitter()
+        t0 = time.time()
+        res = {"kind": "db", "key": db_key(t), "target": t.get("name", t["host"]),
+               "host": t["host"], "port": t["port"]}
+        try:
+            s = socket.create_connection((t["host"], t["port"]), timeout=self.timeout)
+            s.close()
+            res["up"] = True
+        except Exception as e:
+            res["up"] = False
+            res["error"] = str(e)
+        res["latency_ms"] = round((time.time() - t0) * 1000, 3)
+        res["checked_at"] = t0
+        return res
+
+    def probe_pod(self, t: Dict[str, Any]) -> Dict[str, Any]:
+        self._jitter()
+        t0 = time.time()
+        res = {"kind": "pod", "key": pod_key(t), "target": t["name"], "namespace": t["namespace"],
+               "context": t.get("context", ""), "desired": t["desired_replicas"]}
+        cmd = ["kubectl", "get", "deploy", t["name"], "-n", t["namespace"],
+               "-o", "jsonpath={.status.readyReplicas}"]
+        if t.get("context"):
+            cmd += ["--context", t["context"]]
+        try:
+            r = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout + 2)
+            if r.returncode != 0:
+                raise RuntimeError(r.stderr.strip() or f"kubectl exit {r.returncode}")
+            res["ready"] = int(r.stdout.strip() or "0")
+            res["up"] = res["ready"] >= res["desired"]
+        except Exception as e:
+            res["up"] = False
+            res["error"] = str(e)
+        res["latency_ms"] = round((time.time() - t0) * 1000, 3)
+        res["checked_at"] = t0
+        return res
+
+    # ---------- 状态文件 ----------
+    def _read_status(self) -> Dict[str, Any]:
+        try:
+            with open(self.status_file, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_status(self, status: Dict[str, Any]):
+        tmp = f"{self.status_file}.{os.getpid()}.partial"
+        with open(tmp, "w") as f:
+            json.dump(status, f, ensure_ascii=False)
+        os.replace(tmp, self.status_file)
+
+    # ---------- 调度 ----------
+    def _locked(self, fn):
+        """持锁执行 fn(status)；只覆盖读写状态文件，不覆盖探测本身"""
+        with open(self.status_file + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                return fn(self._read_status())
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def probe(self, kinds=("pod", "db")) -> List[Dict[str, Any]]:
+        """
+        返回所选类型全部目标的最新结果；缓存未过期的直接复用，
+        其余由本进程认领后并发探测，再写回状态文件
+        """
+        targets = []
+        if "pod" in kinds:
+            targets += [(pod_key(t), self.probe_pod, t) for t in self.config.get("pods", [])]
+        if "db" in kinds:
+            targets += [(db_key(t), self.probe_db, t) for t in self.config.get("databases", [])]
+        if not targets:
+            return []
+
+        os.makedirs(os.path.dirname(self.status_file) or ".", exist_ok=True)
+        claim_ttl = self.timeout + self.config.get("jitter_sec", 0) + CLAIM_GRACE_SEC
+
+        def claim(status):
+            now = time.time()
+            claims = {k: exp for k, exp in status.get("_claims", {}).items() if exp > now}
+            mine = []
+            for k, fn, t in targets:
+                if now - status.get(k, {}).get("checked_at", 0) <= self.ttl:
+                    continue
+                # 另一进程正在探测且有旧结果可用：不重复探测
+                if k in claims and k in status:
+                    continue
+                claims[k] = now + claim_ttl
+                mine.append((k, fn, t))
+            if mine:
+                status["_claims"] = claims
+                self._write_status(status)
+            return status, mine
+
+        status, mine = self._locked(claim)
+        if mine:
+            workers = max(1, min(self.config.get("max_parallel", 8), len(mine)))
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                results = list(ex.map(lambda x: x[1](x[2]), mine))
+
+            def merge(latest):
+                claims = latest.get("_claims", {})
+                for res in results:
+                    latest[res["key"]] = res
+                    claims.pop(res["key"], None)
+                latest["_claims"] = claims
+                self._write_status(latest)
+                return latest
+
+            status = self._locked(merge)
+
+        out = []
+        for k, _, _ in targets:
+            res = dict(status[k])
+            res["checked_at"] = _utc_iso(res["checked_at"])
+            out.append(res)
+        return out
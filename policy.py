@@ -19,3 +19,13 @@ class PolicyEngine:
         detected = {a["type"] for a in anomalies}
 
         return required.issubset(detected)
+
+    def scale_bounds(self, service: str) -> Dict[str, Any]:
+        """容量模型使用的副本上下限与延迟 SLO"""
+        auto = self.config.get("auto_scale", {})
+        svc_cfg = auto.get("services", {}).get(service, {})
+        return {
+            "min_replicas": svc_cfg.get("min_replicas", 1),
+            "max_scale": svc_cfg.get("max_scale", auto.get("max_scale", 10)),
+            "latency_slo_ms": svc_cfg.get("latency_slo_ms", 1000)
+        }
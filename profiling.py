@@ -0,0 +1,150 @@
+# profiling.py
+"""
+周期级性能剖析（exporter.run_once 与 agent 每个 payload 共用）
+
+- lap(name)：粗粒度阶段计时（ClickHouse / 序列化 / 压缩 / Correlator / FlashRAG ...），
+  记录距上一次 lap 的耗时，只是一次 perf_counter，常开
+- 采样剖析：后台线程按 interval_ms 读取进入 cycle() 的线程的栈，输出 folded stacks
+  （flamegraph.pl / speedscope 可直接读取）；DecisionSink / 线程池等空闲线程不采样
+- 触发条件：每第 N 个周期，或周期耗时超过 slow_ms（配置 slow_ms 时采样线程常驻）
+- tracemalloc：配置后从启动起常开，每第 M 个周期抓一次快照，与上一次快照做差
+  （快照是累计存活内存，逐周期的泄漏会体现为增长）
+- 产物写在 payload 旁边：<payload>.<proc>.seq-<seq>.{folded,stages.json,tracemalloc.txt}
+
+未开启任何触发条件时 cycle() / lap() 只做计时，不启动线程
+"""
+import os, sys, json, time, threading, tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+
+class StackSampler:
+    def __init__(self, interval_ms: float, thread_id: int):
+        self.interval = interval_ms / 1000.0
+        self.thread_id = thread_id
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.stacks = Counter()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cycle-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+
+class CycleProfiler:
+    def __init__(self, proc: str, every_n: int = 0, slow_ms: float = 0,
+                 interval_ms: float = 5, tracemalloc_every_n: int = 0, tracemalloc_top: int = 30):
+        self.proc = proc
+        self.every_n = every_n
+        self.slow_ms = slow_ms
+        self.interval_ms = interval_ms
+        self.tracemalloc_every_n = tracemalloc_every_n
+        self.tracemalloc_top = tracemalloc_top
+        self.sampling = every_n > 0 or slow_ms > 0
+        self.n = 0
+        self._stages: Dict[str, float] = {}
+        self._lap_t = time.perf_counter()
+        self._output: Optional[str] = None
+        self._seq: Optional[str] = None
+        self._last_snapshot = None
+        if tracemalloc_every_n > 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @classmethod
+    def from_config(cls, proc: str, cfg: Dict[str, Any]) -> "CycleProfiler":
+        return cls(proc, cfg.get("every_n", 0), cfg.get("slow_ms", 0), cfg.get("interval_ms", 5),
+                   cfg.get("tracemalloc_every_n", 0), cfg.get("tracemalloc_top", 30))
+
+    # ---------- 周期内调用 ----------
+    def lap(self, name: str):
+        """把距上一次 lap（或周期开始）的耗时记到 name 阶段"""
+        now = time.perf_counter()
+        self._stages[name] = self._stages.get(name, 0.0) + (now - self._lap_t) * 1000
+        self._lap_t = now
+
+    def set_output(self, payload_path: str, seq: str):
+        """周期产物与 payload 放在一起（payload 路径在周期中途才确定）"""
+        self._output = payload_path
+        self._seq = seq
+
+    # ---------- 周期边界 ----------
+    @contextmanager
+    def cycle(self):
+        self.n += 1
+        self._stages = {}
+        self._output = self._seq = None
+        sampler = None
+        if self.sampling:
+            sampler = StackSampler(self.interval_ms, threading.get_ident())
+            sampler.start()
+        snap = self.tracemalloc_every_n > 0 and self.n % self.tracemalloc_every_n == 0
+        t0 = self._lap_t = time.perf_counter()
+        try:
+            yield self
+        finally:
+            total_ms = (time.perf_counter() - t0) * 1000
+            stacks = sampler.stop() if sampler else None
+            keep = stacks is not None and (
+                (self.every_n and self.n % self.every_n == 0)
+                or (self.slow_ms and total_ms >= self.slow_ms)
+            )
+            snapshot = None
+            if snap:
+                snapshot = tracemalloc.take_snapshot()
+            if keep or snapshot is not None:
+                try:
+                    self._dump(total_ms, stacks if keep else None, snapshot)
+                except Exception as e:
+                    print(f"[PROFILE] dump failed: {e}", file=sys.stderr)
+
+    def _prefix(self) -> str:
+        base = self._output or os.path.join(".", f"cycle_{self.n}")
+        return f"{base}.{self.proc}.seq-{self._seq or self.n}"
+
+    def _dump(self, total_ms: float, stacks, snapshot):
+        prefix = self._prefix()
+        os.makedirs(os.path.dirname(prefix) or ".", exist_ok=True)
+        with open(prefix + ".stages.json", "w") as f:
+            json.dump({
+                "proc": self.proc,
+                "cycle": self.n,
+                "seq": self._seq,
+                "total_ms": round(total_ms, 3),
+                "stages_ms": {k: round(v, 3) for k, v in self._stages.items()},
+            }, f, ensure_ascii=False, indent=2)
+        if stacks:
+            with open(prefix + ".folded", "w") as f:
+                for stack, n in stacks.most_common():
+                    f.write(f"{stack} {n}\n")
+        if snapshot is not None:
+            with open(prefix + ".tracemalloc.txt", "w") as f:
+                if self._last_snapshot is not None:
+                    f.write("# diff vs previous snapshot\n")
+                    stats = snapshot.compare_to(self._last_snapshot, "lineno")
+                else:
+                    f.write("# first snapshot\n")
+                    stats = snapshot.statistics("lineno")
+                for s in stats[:self.tracemalloc_top]:
+                    f.write(f"{s}\n")
+            self._last_snapshot = snapshot
+        print(f"[PROFILE] cycle {self.n} {total_ms:.1f}ms -> {prefix}.*")
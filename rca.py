@@ -22,5 +22,19 @@ class RCAEngine:
                     "confidence": d["score"],
                     "suggestion": "Scale replicas or increase CPU limits"
                 })
+            elif d["type"] == "METRIC_CHANGE_POINT":
+                results.append({
+                    "root_cause": "Metric level shift",
+                    "confidence": d["score"],
+                    "suggestion": "Check changes around the onset time of the top shifted series",
+                    "evidence": d["evidence"]["top"][:3]
+                })
+            elif d["type"] == "DB_CONNECTION_ERROR":
+                results.append({
+                    "root_cause": "Database unreachable",
+                    "confidence": 0.9,
+                    "suggestion": "Check MySQL availability and network path",
+                    "evidence": d.get("evidence", {})
+                })
 
         return results
@@ -0,0 +1,121 @@
+# sampling.py
+"""
+traces / logs 分层采样（exporter 本地兜底 + agent 加权统计）
+
+分层：
+- error   : 错误 span / 错误日志，预算内全部保留
+- tail    : 每个 operation 耗时最高的 K 条非错误 span（尾延迟样本）；
+            总数超出 max_tail 时只保留全局最慢的 max_tail 条，其余归入 uniform，
+            tail 层始终全量保留（weight = 1），不会把较快 span 的权重摊到最慢的 span 上
+- uniform : 其余记录的均匀蓄水池样本
+
+每条记录带 sample_class / sample_weight，weight = 该层总数 / 该层保留数，
+detector 按权重还原整个窗口的统计量。服务端采样 SQL 见 aiops_lowlatency.py，
+这里的实现与之同构，用于 ClickHouse 不支持窗口函数等情况下的本地兜底。
+"""
+import heapq
+import random
+from typing import Dict, Any, List, Iterable, Optional
+
+ERROR_LEVELS = ('ERROR', 'FATAL')
+
+
+class Reservoir:
+    """Algorithm R 蓄水池：流式输入，等概率保留 size 条"""
+
+    def __init__(self, size: int, seed: Optional[int] = None):
+        self.size = size
+        self.seen = 0
+        self.items: List[Any] = []
+        self._rnd = random.Random(seed)
+
+    def add(self, item):
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return
+        j = self._rnd.randrange(self.seen)
+        if j < self.size:
+            self.items[j] = item
+
+    def weight(self) -> float:
+        return self.seen / len(self.items) if self.items else 1.0
+
+
+def _mark(items: List[Dict[str, Any]], cls: str, weight: float) -> List[Dict[str, Any]]:
+    for it in items:
+        it["sample_class"] = cls
+        it["sample_weight"] = weight
+    return items
+
+
+def is_error_span(span) -> bool:
+    return bool(span.get("error"))
+
+
+def is_error_log(log) -> bool:
+    return log.get("level") in ERROR_LEVELS or bool(log.get("exception_type"))
+
+
+def sample_spans(spans: Iterable[Dict[str, Any]], max_error: int, tail_per_op: int,
+                 max_tail: int, max_uniform: int, seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    errors = Reservoir(max_error, seed)
+    uniform = Reservoir(max_uniform, seed)
+    # 每个 operation 一个小顶堆，保留耗时最高的 tail_per_op 条；挤出的进入 uniform
+    tails: Dict[str, List] = {}
+    seq = 0
+    for s in spans:
+        if is_error_span(s):
+            errors.add(s)
+            continue
+        heap = tails.setdefault(s.get("operation") or "", [])
+        entry = (s.get("duration_ms") or 0.0, seq, s)
+        seq += 1
+        if len(heap) < tail_per_op:
+            heapq.heappush(heap, entry)
+        else:
+            uniform.add(heapq.heappushpop(heap, entry)[2])
+
+    tail = [e[2] for heap in tails.values() for e in heap]
+    if len(tail) > max_tail:
+        tail.sort(key=lambda x: x.get("duration_ms") or 0.0, reverse=True)
+        for s in tail[max_tail:]:
+            uniform.add(s)
+        tail = tail[:max_tail]
+
+    return (_mark(errors.items, "error", errors.weight())
+            + _mark(tail, "tail", 1.0)
+            + _mark(uniform.items, "uniform", uniform.weight()))
+
+
+def sample_logs(logs: Iterable[Dict[str, Any]], max_error: int, max_uniform: int,
+                seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    errors = Reservoir(max_error, seed)
+    uniform = Reservoir(max_uniform, seed)
+    for l in logs:
+        (errors if is_error_log(l) else uniform).add(l)
+    return (_mark(errors.items, "error", errors.weight())
+            + _mark(uniform.items, "uniform", uniform.weight()))
+
+
+# ================== agent 侧加权统计 ==================
+def sample_weight(rec) -> float:
+    # rec 为 records 中的记录对象（agent 侧 payload 已转换）
+    return rec.sample_weight or 1.0
+
+
+def weighted_count(items: Iterable[Any], pred=None) -> float:
+    return sum(sample_weight(x) for x in items if pred is None or pred(x))
+
+
+def weighted_quantile(values: List[float], weights: List[float], q: float) -> float:
+    """加权分位数（q ∈ [0, 1]），权重全为 1 时与最近秩分位数一致"""
+    pairs = sorted(zip(values, weights))
+    total = sum(w for _, w in pairs)
+    target = q * total
+    acc = 0.0
+    for v, w in pairs:
+        acc += w
+        if acc >= target:
+            return v
+    return pairs[-1][0]
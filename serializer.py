@@ -0,0 +1,137 @@
+# serializer.py
+"""
+payload 序列化（exporter 写 / agent 读）
+
+- 按查询列 schema 预先选好每列的转换函数，按列批量转换，
+  避免对每个单元格做 safe_json_value 的 isinstance 递归
+- 编码后一次性写入压缩流（不经过 gzip 文本包装层）
+- compact=False 时输出与旧版 json.dump(indent=2) 逐字节一致
+"""
+import os, json, gzip
+from datetime import datetime
+from typing import Dict, Any, List, Sequence
+
+try:
+    import zstandard
+except ImportError:  # zstd 为可选依赖
+    zstandard = None
+
+
+def safe_json_value(v):
+    if v is None or isinstance(v, (str, int, float, bool)):
+        return v
+    if isinstance(v, datetime):
+        return v.isoformat()
+    if isinstance(v, (bytes, bytearray)):
+        try: return v.decode('utf-8')
+        except Exception: return v.hex()
+    try:
+        if isinstance(v, memoryview):
+            b = v.tobytes()
+            try: return b.decode('utf-8')
+            except Exception: return b.hex()
+    except Exception: pass
+    if isinstance(v, dict):
+        return {str(k): safe_json_value(vv) for k, vv in v.items()}
+    if isinstance(v, (list, tuple)):
+        return [safe_json_value(vv) for vv in v]
+    return str(v)
+
+def rows_to_objs(keys, rows):
+    return [{k: safe_json_value(v) for k, v in zip(keys, r)} for r in rows]
+
+# ================== 列转换器 ==================
+# 快路径只判断精确类型；其余情况回落到 safe_json_value，结果与旧版一致
+def _conv_str(v):
+    return v if v.__class__ is str else safe_json_value(v)
+
+def _conv_datetime(v):
+    return v.isoformat() if v.__class__ is datetime else safe_json_value(v)
+
+def _conv_number(v):
+    c = v.__class__
+    return v if c is float or c is int or c is bool else safe_json_value(v)
+
+def _conv_array(v):
+    # 数值数组（metric_series 的 offsets / values），元素已是 int / float
+    return v if v.__class__ is list else safe_json_value(v)
+
+COLUMN_CONVERTERS = {
+    'str': _conv_str,
+    'datetime': _conv_datetime,
+    'number': _conv_number,
+    'array': _conv_array,
+    'any': safe_json_value,
+}
+
+# 各查询非字符串列的类型（未列出的列按 str 处理）
+COLUMN_TYPES = {
+    'time': 'datetime',
+    'timestamp': 'datetime',
+    'first_seen': 'datetime',
+    'last_seen': 'datetime',
+    'duration_ms': 'number',
+    'error': 'number',
+    'sample_count': 'number',
+    'min_value': 'number',
+    'max_value': 'number',
+    'avg_last': 'number',
+    'sum_value': 'number',
+    'sample_weight': 'number',
+    'fingerprint': 'number',
+    'offsets': 'array',
+    'values': 'array',
+}
+
+def compile_schema(keys: Sequence[str], types: Dict[str, str] = COLUMN_TYPES):
+    return [COLUMN_CONVERTERS[types.get(k, 'str')] for k in keys]
+
+def _convert_column(conv, col):
+    if conv is _conv_str and all(v.__class__ is str for v in col):
+        return col
+    return list(map(conv, col))
+
+def columns_to_objs(keys: Sequence[str], columns: Sequence[Sequence[Any]], convs=None) -> List[Dict[str, Any]]:
+    """列式结果 -> dict 列表；与 rows_to_objs(keys, rows) 结果相同"""
+    if not columns or not len(columns[0]):
+        return []
+    convs = convs or compile_schema(keys)
+    converted = [_convert_column(c, col) for c, col in zip(convs, columns)]
+    keys = list(keys)[:len(converted)]
+    return [dict(zip(keys, r)) for r in zip(*converted)]
+
+# ================== 编码与写入 ==================
+def encode_payload(payload: Dict[str, Any], compact: bool = True) -> bytes:
+    if compact:
+        s = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+    else:
+        s = json.dumps(payload, ensure_ascii=False, indent=2)
+    return s.encode('utf-8')
+
+def payload_suffix(compression: str) -> str:
+    return '.json.zst' if compression == 'zstd' else '.json.gz'
+
+def atomic_payload_write(path: str, payload: Dict[str, Any], compression: str = 'gzip',
+                         level: int = 6, compact: bool = True):
+    if compression == 'zstd' and zstandard is None:
+        raise RuntimeError("compression=zstd requires the 'zstandard' package")
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    data = encode_payload(payload, compact)
+    tmp = path + '.partial'
+    if compression == 'zstd':
+        with open(tmp, 'wb') as f:
+            f.write(zstandard.ZstdCompressor(level=level).compress(data))
+    else:
+        with gzip.open(tmp, 'wb', compresslevel=level) as g:
+            g.write(data)
+    os.replace(tmp, path)
+
+def read_payload(path: str) -> Dict[str, Any]:
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"cannot read {path}: 'zstandard' package not installed")
+        with open(path, 'rb') as f:
+            with zstandard.ZstdDecompressor().stream_reader(f) as r:
+                return json.load(r)
+    with gzip.open(path, 'rb') as f:
+        return json.load(f)
@@ -0,0 +1,194 @@
+# sinks.py
+"""
+Decision 输出子系统
+
+- DecisionSink：有界缓冲 + 后台线程按批刷新，emit 永不阻塞检测主循环
+  （缓冲满时丢弃并计数）
+- 写入器可插拔：JSONL（批量 fsync）、SQLite、HTTP webhook（重试 + 连接复用）
+- 投递指标：emitted / dropped / 每个写入器的 delivered / failed / 批次耗时；
+  写入器按配置的 name（缺省为类型）区分，同名时追加序号，agent 定期打印 stats()
+"""
+import os, sys, json, time, queue, sqlite3, threading
+from typing import Dict, Any, List
+
+import requests
+
+
+class DecisionWriter:
+    name = "base"
+
+    def write_batch(self, items: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JsonlWriter(DecisionWriter):
+    """追加写 JSONL，每批一次 flush + fsync"""
+    name = "jsonl"
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.f = open(path, "a", encoding="utf-8")
+
+    def write_batch(self, items):
+        self.f.write("".join(json.dumps(d, ensure_ascii=False) + "\n" for d in items))
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def close(self):
+        self.f.close()
+
+
+class SqliteWriter(DecisionWriter):
+    name = "sqlite"
+
+    def __init__(self, path: str, table: str = "decisions"):
+        self.table = table
+        # 只在刷新线程中使用
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "decision_id TEXT PRIMARY KEY, timestamp TEXT, service TEXT, body TEXT)"
+        )
+        self.conn.commit()
+
+    def write_batch(self, items):
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?)",
+                [(d.get("decision_id"), d.get("timestamp"), d.get("service"),
+                  json.dumps(d, ensure_ascii=False)) for d in items]
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+class WebhookWriter(DecisionWriter):
+    """一批 POST 一次（JSON 数组），Session 复用连接，失败指数退避重试"""
+    name = "webhook"
+
+    def __init__(self, url: str, timeout: float = 5, retries: int = 3, backoff_sec: float = 1,
+                 headers: Dict[str, str] = None):
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_sec = backoff_sec
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+
+    def write_batch(self, items):
+        for attempt in range(self.retries):
+            try:
+                resp = self.session.post(self.url, json=items, timeout=self.timeout)
+                resp.raise_for_status()
+                return
+            except Exception:
+                if attempt + 1 >= self.retries:
+                    raise
+                time.sleep(self.backoff_sec * (2 ** attempt))
+
+    def close(self):
+        self.session.close()
+
+
+WRITERS = {
+    "jsonl": lambda c: JsonlWriter(c["path"]),
+    "sqlite": lambda c: SqliteWriter(c["path"], c.get("table", "decisions")),
+    "webhook": lambda c: WebhookWriter(c["url"], c.get("timeout_sec", 5), c.get("retries", 3),
+                                       c.get("backoff_sec", 1), c.get("headers")),
+}
+
+
+class DecisionSink:
+    def __init__(self, writers: List[DecisionWriter], max_buffer: int = 1000,
+                 batch_size: int = 50, flush_interval_sec: float = 2.0):
+        self.writers = writers
+        names = [w.name for w in writers]
+        # 两个同类型写入器（如两个 webhook）各自计数
+        self.labels = [n if names.count(n) == 1 else f"{n}#{i}" for i, n in enumerate(names)]
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_sec
+        self.buffer: "queue.Queue" = queue.Queue(maxsize=max_buffer)
+        self.metrics = {
+            "emitted": 0,
+            "dropped": 0,
+            "batches": 0,
+            "last_flush_ms": 0.0,
+            "writers": {label: {"delivered": 0, "failed": 0} for label in self.labels},
+        }
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="decision-sink", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any]) -> "DecisionSink":
+        writers = []
+        for c in cfg.get("writers", []):
+            w = WRITERS[c["type"]](c)
+            w.name = c.get("name", w.name)
+            writers.append(w)
+        return cls(writers, cfg.get("max_buffer", 1000), cfg.get("batch_size", 50),
+                   cfg.get("flush_interval_sec", 2.0))
+
+    def emit(self, decision) -> bool:
+        """非阻塞入队；缓冲已满返回 False"""
+        item = decision.to_dict() if hasattr(decision, "to_dict") else decision
+        try:
+            self.buffer.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.metrics["dropped"] += 1
+            return False
+        with self._lock:
+            self.metrics["emitted"] += 1
+        return True
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.buffer.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: List[Dict[str, Any]]):
+        t0 = time.time()
+        for w, label in zip(self.writers, self.labels):
+            try:
+                w.write_batch(batch)
+                ok = True
+            except Exception as e:
+                ok = False
+                print(f"[SINK] writer {label} failed batch of {len(batch)}: {e}", file=sys.stderr)
+            with self._lock:
+                self.metrics["writers"][label]["delivered" if ok else "failed"] += len(batch)
+        with self._lock:
+            self.metrics["batches"] += 1
+            self.metrics["last_flush_ms"] = round((time.time() - t0) * 1000, 3)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._stop.wait(self.flush_interval)
+            while True:
+                batch = self._drain()
+                if not batch:
+                    break
+                self._flush(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = json.loads(json.dumps(self.metrics))
+        out["buffered"] = self.buffer.qsize()
+        return out
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        for w in self.writers:
+            w.close()